@@ -0,0 +1,318 @@
+# bench_api.py - Throughput, latency and memory of the fleet API, in-process and over a socket
+#
+# Usage: python benchmarks/bench_api.py [--robots 4 100 1000 10000] [--layouts default large_500x500]
+#                                       [--transports inprocess socket] [--threads 4] [--requests 100]
+#                                       [--output results.json] [--baseline old.json]
+# Every robots x layout x transport combination runs in a fresh process:
+# the fleet is built from --seed, then each workload is driven from
+# --threads client threads, either through Flask's test client or over
+# HTTP/1.1 keep-alive connections to a local server:
+#   get_robots         GET /api/robots (the full fleet snapshot)
+#   get_warehouse_map  GET /api/warehouse/map (the whole floor, or its top-left window on large floors)
+#   assign_task        POST /api/task/assign to random robots
+#   mixed              the dashboard's polling (robots deltas every 3s, stats every 2s, health
+#                      every 5s) with task assignments and map refreshes alongside, engine running
+# Results (requests/s, p50/p99 latency, peak RSS) are written as JSON with
+# sorted keys, so two runs can be diffed; --baseline prints the change
+# against an earlier file.
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from headless import build_fleet, normalize_scenario, process_pool  # noqa: E402
+
+try:
+    import resource
+except ImportError:     # not on Windows
+    resource = None
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+WORKLOADS = ("get_robots", "get_warehouse_map", "assign_task", "mixed")
+TASK_TYPES = ("pick", "move", "inspect")
+# The dashboard's polling intervals in seconds (templates/index.html)
+DASHBOARD_POLLS = {"robots": 3.0, "stats": 2.0, "health": 5.0}
+
+
+class InProcessClient:
+    def __init__(self, app, port=None):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        return self.client.open(path, method=method, json=body).status_code
+
+
+class SocketClient:
+    """One keep-alive HTTP connection to the local server."""
+
+    def __init__(self, app, port):
+        self.port = port
+        self.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+
+    def request(self, method, path, body=None):
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        try:
+            self.connection.request(method, path, payload, headers)
+            response = self.connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            # The server closed the connection; retry once on a new one
+            self.connection.close()
+            self.connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+            self.connection.request(method, path, payload, headers)
+            response = self.connection.getresponse()
+        response.read()
+        return response.status
+
+
+def start_server(app):
+    """Serve ``app`` on a free local port from a background thread."""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Driver(threading.Thread):
+    """Sends ``requests`` requests chosen by ``next_request(rng)`` and times
+    each one."""
+
+    def __init__(self, client, next_request, requests, seed):
+        super().__init__(daemon=True)
+        self.client = client
+        self.next_request = next_request
+        self.requests = requests
+        self.rng = random.Random(seed)
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        for _ in range(self.requests):
+            method, path, body = self.next_request(self.rng)
+            started = time.perf_counter()
+            try:
+                status = self.client.request(method, path, body)
+            except (http.client.HTTPException, OSError):
+                status = None
+            self.latencies.append(time.perf_counter() - started)
+            if status is None or status >= 400:
+                self.errors += 1
+
+
+def assign_request(robots):
+    return lambda rng: ("POST", "/api/task/assign",
+                        {"robot_id": rng.randint(1, robots), "task_type": rng.choice(TASK_TYPES)})
+
+
+def dashboard_request(model):
+    """The dashboard's polls, each drawn as often as the dashboard sends it,
+    asking for robot changes since the version last seen."""
+    names = sorted(DASHBOARD_POLLS)
+    weights = [1 / DASHBOARD_POLLS[name] for name in names]
+    paths = {"stats": "/api/simulation/stats", "health": "/api/system/health"}
+
+    def next_request(rng):
+        name = rng.choices(names, weights)[0]
+        if name == "robots":
+            # A version a poll or two behind the latest
+            return "GET", f"/api/robots?since={max(0, model.latest_snapshot['version'] - rng.randint(0, 2))}", None
+        return "GET", paths[name], None
+    return next_request
+
+
+def operator_request(robots):
+    """Task assignments, each followed by the map refresh the dashboard does."""
+    assign = assign_request(robots)
+    pending = []
+
+    def next_request(rng):
+        if pending:
+            return pending.pop()
+        pending.append(("GET", "/api/warehouse/map?r0=0&c0=0&r1=9&c1=9", None))
+        return assign(rng)
+    return next_request
+
+
+def run_workload(model, client_class, port, workload, args, robots):
+    """Drive one workload and summarise it."""
+    seeds = range(args.seed * 1000, args.seed * 1000 + args.threads)
+    if workload == "mixed":
+        # Three dashboards to every operator
+        operators = max(1, args.threads // 4)
+        drivers = [Driver(client_class(model.app, port), operator_request(robots), args.requests, seed)
+                   for seed in seeds[:operators]]
+        drivers += [Driver(client_class(model.app, port), dashboard_request(model), args.requests, seed)
+                    for seed in seeds[operators:]]
+    else:
+        next_request = {
+            "get_robots": lambda rng: ("GET", "/api/robots", None),
+            "get_warehouse_map": lambda rng: ("GET", "/api/warehouse/map", None),
+            "assign_task": assign_request(robots)
+        }[workload]
+        drivers = [Driver(client_class(model.app, port), next_request, args.requests, seed) for seed in seeds]
+
+    engine = None
+    if workload == "mixed":
+        model.app.test_client().post("/api/simulation/control", json={"action": "start"})
+        engine = model.SimulationEngine(model.simulation_tick, args.tick_hz)
+        engine.start()
+    started = time.perf_counter()
+    for driver in drivers:
+        driver.start()
+    for driver in drivers:
+        driver.join()
+    elapsed = time.perf_counter() - started
+    if engine is not None:
+        engine.stop()
+        model.app.test_client().post("/api/simulation/control", json={"action": "stop"})
+
+    latencies = sorted(latency for driver in drivers for latency in driver.latencies)
+    return {
+        "workload": workload,
+        "requests": len(latencies),
+        "errors": sum(driver.errors for driver in drivers),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.5) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3)
+        },
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def run_config(config, args):
+    """Build the fleet for one configuration and run every workload on it.
+    Runs in a process of its own: the server module reads its settings
+    from the environment when imported."""
+    os.environ["ROBOFLEET_DATA_DIR"] = ""
+    os.environ["ROBOFLEET_SEED"] = str(args.seed)
+    scenario = normalize_scenario({"robots": config["robots"], "layout": config["layout"], "seed": args.seed})
+    os.environ["ROBOFLEET_LAYOUT"] = scenario["layout"] or ""
+    import main as model
+
+    started = time.perf_counter()
+    with model.state_lock:
+        build_fleet(model, scenario, random.Random(args.seed))
+        model.publish_snapshot()
+    setup_s = time.perf_counter() - started
+
+    server = start_server(model.app) if config["transport"] == "socket" else None
+    client_class = SocketClient if server is not None else InProcessClient
+    port = server.server_port if server is not None else None
+    try:
+        results = [run_workload(model, client_class, port, workload, args, config["robots"])
+                   for workload in args.workloads]
+    finally:
+        if server is not None:
+            server.shutdown()
+    grid = f"{model.warehouse.rows}x{model.warehouse.cols}"
+    return [dict(config, grid=grid, setup_s=round(setup_s, 3), **result) for result in results]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def row_key(row):
+    return (row["robots"], row["layout"], row["transport"], row["workload"])
+
+
+def print_baseline_changes(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {row_key(row): row for row in json.load(f)["results"]}
+    print(f"\nChange against {baseline_path}:")
+    for row in results:
+        old = baseline.get(row_key(row))
+        if old is None:
+            continue
+        throughput = (row["throughput_rps"] / old["throughput_rps"] - 1) * 100 if old["throughput_rps"] else 0
+        p99 = (row["latency_ms"]["p99"] / old["latency_ms"]["p99"] - 1) * 100 if old["latency_ms"]["p99"] else 0
+        print(f"{row['robots']:6} {row['layout'] or 'default':16} {row['transport']:9} {row['workload']:18} "
+              f"throughput {throughput:+6.1f}%   p99 {p99:+6.1f}%")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Fleet API benchmark suite")
+    parser.add_argument("--robots", type=int, nargs="+", default=[4, 100, 1000, 10000])
+    parser.add_argument("--layouts", nargs="+", default=["default", "large_500x500"],
+                        help="layout files in layouts/ ('default' for the server's default floor)")
+    parser.add_argument("--transports", nargs="+", choices=["inprocess", "socket"], default=["inprocess", "socket"])
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument("--threads", type=int, default=4, help="client threads per workload")
+    parser.add_argument("--requests", type=int, default=100, help="requests per client thread")
+    parser.add_argument("--tick-hz", type=float, default=1.0, help="engine rate during the mixed workload")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    configs = [{"robots": robots, "layout": None if layout == "default" else layout, "transport": transport}
+               for layout in args.layouts for robots in args.robots for transport in args.transports]
+    results = []
+    for config in configs:
+        # One process per configuration, one at a time so runs don't
+        # compete for the CPU
+        with process_pool(1) as pool:
+            rows = pool.submit(run_config, config, args).result()
+        for row in rows:
+            latency = row["latency_ms"]
+            print(f"{row['robots']:6} robots {row['grid']:>8} {row['transport']:9} {row['workload']:18} "
+                  f"{row['throughput_rps']:9.1f} req/s  p50 {latency['p50']:8.2f} ms  p99 {latency['p99']:8.2f} ms"
+                  f"  {row['errors']} errors  peak RSS {row['peak_rss_mb']} MB", flush=True)
+        results.extend(rows)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "arguments": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"Results written to {args.output}")
+    if args.baseline:
+        print_baseline_changes(results, args.baseline)
+    return 1 if any(row["errors"] for row in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,131 @@
+# bench_emergency_stop.py - Measure emergency-stop latency under concurrent API load
+#
+# Usage: python benchmarks/bench_emergency_stop.py [--robots 200] [--load-threads 8]
+#                                                  [--trials 200] [--max-p99-ms 100]
+# Runs the engine and --load-threads clients (fleet reads, analytics, task
+# assignments, route optimization) while repeatedly posting
+# /api/emergency/stop. Each stop is timed from request to response, and the
+# fleet is then checked: every robot halted, no route left. Exits non-zero
+# if a stop left anything running or the p99 latency is over --max-p99-ms.
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402
+from headless import build_fleet, normalize_scenario  # noqa: E402
+
+
+class Load(threading.Thread):
+    def __init__(self, robots, seed, stop_event):
+        super().__init__(daemon=True)
+        self.robots = robots
+        self.rng = random.Random(seed)
+        self.stop_event = stop_event
+        self.sent = 0
+
+    def run(self):
+        client = main.app.test_client()
+        while not self.stop_event.is_set():
+            roll = self.rng.random()
+            if roll < 0.4:
+                client.get("/api/robots")
+            elif roll < 0.55:
+                client.get("/api/analytics")
+            elif roll < 0.9:
+                client.post("/api/task/assign", json={
+                    "robot_id": self.rng.randint(1, self.robots),
+                    "task_type": self.rng.choice(["pick", "move", "inspect"])
+                })
+            else:
+                client.post("/api/ai/command", json={"command": "optimize routes"})
+            self.sent += 1
+
+
+def check_halted():
+    """Everything a completed emergency stop must leave behind."""
+    with main.state_lock:
+        running = [robot.id for robot in main.fleet if robot.task != "EMERGENCY STOP"]
+        errors = [f"robots {running[:10]} not halted"] if running else []
+        if main.coordinator.routes:
+            errors.append(f"{len(main.coordinator.routes)} routes still active")
+        if not main.simulation.emergency_mode:
+            errors.append("emergency mode not set")
+        published = [robot["id"] for robot in main.latest_snapshot["robots"] if robot["task"] != "EMERGENCY STOP"]
+        if published:
+            errors.append(f"robots {published[:10]} not halted in the published snapshot")
+    return errors
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Emergency-stop latency under concurrent API load")
+    parser.add_argument("--robots", type=int, default=200)
+    parser.add_argument("--load-threads", type=int, default=8)
+    parser.add_argument("--trials", type=int, default=200)
+    parser.add_argument("--tick-hz", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-p99-ms", type=float, default=100.0, help="fail above this p99 latency")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with main.state_lock:
+        build_fleet(main, normalize_scenario({"robots": args.robots, "seed": args.seed}), rng)
+        main.publish_snapshot()
+
+    engine = main.SimulationEngine(main.simulation_tick, args.tick_hz)
+    engine.start()
+    stop_event = threading.Event()
+    loads = [Load(args.robots, args.seed + i, stop_event) for i in range(args.load_threads)]
+    for load in loads:
+        load.start()
+
+    client = main.app.test_client()
+    latencies = []
+    server_latencies = []
+    errors = []
+    for trial in range(args.trials):
+        client.post("/api/simulation/control", json={"action": "clear_emergency"})
+        client.post("/api/simulation/control", json={"action": "start"})
+        time.sleep(rng.uniform(0.01, 0.05))
+
+        started = time.perf_counter()
+        response = client.post("/api/emergency/stop").get_json()
+        latencies.append(time.perf_counter() - started)
+        server_latencies.append(response["halt_ms"] / 1000)
+        errors.extend(f"trial {trial}: {error}" for error in check_halted())
+
+    stop_event.set()
+    for load in loads:
+        load.join()
+    engine.stop()
+
+    sent = sum(load.sent for load in loads)
+    p50, p99 = percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000
+    print(f"{args.trials} stops, {args.robots} robots, {args.load_threads} load threads "
+          f"({sent} requests), {engine.tick_count} engine ticks")
+    print(f"request to halted: p50 {p50:.2f} ms, p99 {p99:.2f} ms, max {max(latencies) * 1000:.2f} ms")
+    print(f"in halt_fleet:     p50 {percentile(server_latencies, 0.5) * 1000:.2f} ms, "
+          f"p99 {percentile(server_latencies, 0.99) * 1000:.2f} ms")
+    if errors:
+        for error in errors[:20]:
+            print(f"❌ {error}")
+        print(f"{len(errors)} incomplete stop(s)")
+        return 1
+    if p99 > args.max_p99_ms:
+        print(f"❌ p99 latency over {args.max_p99_ms:g} ms")
+        return 1
+    print("✅ Every stop halted the whole fleet")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
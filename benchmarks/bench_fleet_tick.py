@@ -0,0 +1,104 @@
+# bench_fleet_tick.py - Measure the server's simulation tick time at fleet scale
+#
+# Usage: python benchmarks/bench_fleet_tick.py [--robots 10000] [--layout large_500x500]
+#                                              [--ticks 60] [--tasks-per-tick 0] [--tick-hz 1]
+#                                              [--max-rss-mb 300]
+# Builds a fleet of --robots idle robots (battery 20-100, so many need a
+# charger soon) on --layout and times the server's own simulation_tick
+# (movement, drain, charger booking and trips, metrics) on a simulated
+# clock. The first tick is reported but not judged. --tasks-per-tick also
+# queues tasks, adding their route searches (see bench_path_planner.py).
+# Exits non-zero if the p95 tick is longer than the tick period at
+# --tick-hz, or if peak RSS is over --max-rss-mb.
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from headless import SIMULATED_EPOCH, SimulatedClock, build_fleet, load_model, normalize_scenario  # noqa: E402
+
+try:
+    import resource
+except ImportError:     # not on Windows
+    resource = None
+
+TASK_TYPES = ("pick", "move", "inspect")
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulation tick time at fleet scale")
+    parser.add_argument("--robots", type=int, default=10000)
+    parser.add_argument("--layout", default="large_500x500", help="file in layouts/ or a path")
+    parser.add_argument("--ticks", type=int, default=60, help="ticks judged after the first")
+    parser.add_argument("--tasks-per-tick", type=int, default=0, help="tasks queued before each tick")
+    parser.add_argument("--tick-hz", type=float, default=float(os.environ.get("ROBOFLEET_TICK_HZ", "1.0")),
+                        help="tick rate the simulation must keep up with")
+    parser.add_argument("--max-rss-mb", type=float, default=300.0, help="fail above this peak RSS (0 for no limit)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if args.ticks < 1:
+        parser.error("--ticks must be at least 1")
+
+    scenario = normalize_scenario({"robots": args.robots, "layout": args.layout, "battery": [20, 100],
+                                   "tick_hz": args.tick_hz, "seed": args.seed})
+    # The model reads its configuration from the environment when loaded
+    os.environ["ROBOFLEET_DATA_DIR"] = ""
+    os.environ["ROBOFLEET_TICK_HZ"] = str(scenario["tick_hz"])
+    os.environ["ROBOFLEET_LAYOUT"] = scenario["layout"] or ""
+    os.environ["ROBOFLEET_SEED"] = str(scenario["seed"])
+    model = load_model()
+    clock = model.clock = SimulatedClock(SIMULATED_EPOCH)
+    rng = model.streams.stream("headless")
+    build_fleet(model, scenario, rng)
+    model.simulation.is_running = True
+
+    tick_s = 1.0 / scenario["tick_hz"]
+    times = []
+    for _ in range(args.ticks + 1):
+        with model.state_lock:
+            for _ in range(args.tasks_per_tick):
+                model.scheduler.submit(rng.choice(TASK_TYPES))
+        started = time.perf_counter()
+        model.simulation_tick()
+        times.append(time.perf_counter() - started)
+        clock.now += tick_s
+    first, timed = times[0], sorted(times[1:])
+    p95 = percentile(timed, 0.95)
+    rss = peak_rss_mb()
+    print(f"{args.robots} robots on {model.warehouse.name or args.layout} "
+          f"({model.warehouse.rows}x{model.warehouse.cols}), {args.ticks} ticks at {args.tick_hz:g} Hz")
+    print(f"  first tick      {first * 1000:8.1f} ms")
+    print(f"  tick p50        {percentile(timed, 0.5) * 1000:8.1f} ms")
+    print(f"  tick p95        {p95 * 1000:8.1f} ms")
+    print(f"  tick p99        {percentile(timed, 0.99) * 1000:8.1f} ms")
+    print(f"  tick max        {timed[-1] * 1000:8.1f} ms")
+    print(f"  peak RSS        {rss if rss is not None else '-':>8} MB")
+
+    failed = False
+    if p95 > tick_s:
+        print(f"❌ p95 tick {p95 * 1000:.0f} ms is longer than the {tick_s * 1000:.0f} ms tick period")
+        failed = True
+    if args.max_rss_mb and rss is not None and rss > args.max_rss_mb:
+        print(f"❌ Peak RSS {rss} MB is over {args.max_rss_mb:g} MB")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("✅ The simulation keeps up with the tick rate")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# bench_intent_matcher.py - Measure AI command parsing as the vocabulary grows
+#
+# Usage: python benchmarks/bench_intent_matcher.py [--robots 100 1000 10000 100000]
+#                                                  [--intents 500] [--max-us 50]
+# Builds a parser with --intents synthetic intents plus one name and one
+# "robot <id>" phrase per robot, then times parsing a few commands. Exits
+# non-zero if a parse takes longer than --max-us microseconds on average.
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from intent_matcher import CommandParser  # noqa: E402
+
+COMMANDS = [
+    "charge beta and gamma",
+    "status of charge",
+    "please charge unit 4711 and robot 90 then report the status of zone b",
+    "intent 17 phrase for unit 12 near zone a, then intent 480 phrase",
+    "hello there, nothing to see here at all"
+]
+
+
+def build_parser(robots, intents):
+    vocabulary = {f"intent{i}": [f"intent {i} phrase", f"alias {i}"] for i in range(intents)}
+    vocabulary.update({"charge": ["charge", "charging"], "status": ["status"]})
+    parser = CommandParser(vocabulary)
+    for robot_id in range(1, robots + 1):
+        parser.add_robot(f"Unit-{robot_id}", robot_id)
+        parser.add_robot(f"robot {robot_id}", robot_id)
+    for name in ("Beta-Bot", "Gamma-Bot", "beta", "gamma"):
+        parser.add_robot(name, name.split("-")[0].lower())
+    for zone in ("Zone-A", "Zone-B", "Charging Station"):
+        parser.add_zone(zone, zone)
+    parser.matcher.compile()
+    return parser
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--robots", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--intents", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5000, help="parses of each command")
+    parser.add_argument("--max-us", type=float, default=50.0, help="fail above this mean parse time")
+    args = parser.parse_args()
+
+    worst = 0.0
+    for robots in args.robots:
+        started = time.perf_counter()
+        command_parser = build_parser(robots, args.intents)
+        build_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            for command in COMMANDS:
+                command_parser.parse(command)
+        mean_us = (time.perf_counter() - started) / (args.repeat * len(COMMANDS)) * 1e6
+        worst = max(worst, mean_us)
+        phrases = 2 * (robots + args.intents)
+        print(f"{robots:7} robots, {phrases:7} phrases: build {build_s * 1000:8.1f} ms, "
+              f"parse {mean_us:6.1f} us")
+
+    if worst > args.max_us:
+        print(f"❌ Parsing averaged over {args.max_us:g} us")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
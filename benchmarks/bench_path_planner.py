@@ -0,0 +1,116 @@
+# bench_path_planner.py - Measure route planning throughput on a warehouse layout
+#
+# Usage: python benchmarks/bench_path_planner.py [--layout layouts/large_500x500.json]
+#                                                [--routes 2000] [--astar-routes 200] [--seed 7]
+#                                                [--cooperative 200] [--tick-hz 1] [--route-ticks 10]
+# Exits non-zero if zone routing falls below --min-rate routes per second,
+# if cooperative planning can't give every robot a new route within
+# --route-ticks ticks at --tick-hz, or if two cooperative routes collide.
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from path_planner import PathPlanner  # noqa: E402
+from route_coordinator import RouteCoordinator  # noqa: E402
+from warehouse_map import WarehouseMap, load_layout  # noqa: E402
+
+DEFAULT_LAYOUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layouts", "large_500x500.json")
+
+
+def random_free_cells(planner, rng, count):
+    cells = []
+    while len(cells) < count:
+        cell = (rng.randrange(planner.rows), rng.randrange(planner.cols))
+        if planner.is_passable(cell):
+            cells.append(cell)
+    return cells
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--layout", default=DEFAULT_LAYOUT)
+    parser.add_argument("--routes", type=int, default=2000, help="routes to named zones")
+    parser.add_argument("--astar-routes", type=int, default=200, help="cell-to-cell A* routes")
+    parser.add_argument("--cooperative", type=int, default=200,
+                        help="robots planned together to random cells without collisions")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--min-rate", type=float, default=0.0,
+                        help="fail if zone routes/s falls below this")
+    parser.add_argument("--tick-hz", type=float, default=float(os.environ.get("ROBOFLEET_TICK_HZ", "1.0")),
+                        help="simulation tick rate the cooperative planner must keep up with")
+    parser.add_argument("--route-ticks", type=float, default=10,
+                        help="ticks within which every cooperative robot must be able to get a new route")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    warehouse, load_time = timed(lambda: WarehouseMap(load_layout(args.layout), rng=rng))
+    planner, build_time = timed(lambda: PathPlanner(warehouse))
+    _, warm_time = timed(planner.warm_cache)
+    print(f"Layout {warehouse.name or args.layout}: {warehouse.rows}x{warehouse.cols}")
+    print(f"  map load        {load_time * 1000:8.1f} ms")
+    print(f"  planner build   {build_time * 1000:8.1f} ms")
+    print(f"  distance fields {warm_time * 1000:8.1f} ms ({len(planner.named_targets)} targets)")
+
+    targets = sorted(planner.named_targets)
+    starts = random_free_cells(planner, rng, args.routes)
+    jobs = [(start, rng.choice(targets)) for start in starts]
+    paths, elapsed = timed(lambda: [planner.plan_to(start, target) for start, target in jobs])
+    cells = sum(len(path) - 1 for path in paths if path)
+    zone_rate = len(jobs) / elapsed
+    print(f"  zone routes     {zone_rate:8.0f} routes/s "
+          f"({len(jobs)} routes, mean {cells / max(1, len(jobs)):.0f} cells)")
+
+    pairs = list(zip(random_free_cells(planner, rng, args.astar_routes),
+                     random_free_cells(planner, rng, args.astar_routes)))
+    paths, elapsed = timed(lambda: [planner.plan(start, goal) for start, goal in pairs])
+    cells = sum(len(path) - 1 for path in paths if path)
+    print(f"  A* routes       {len(pairs) / elapsed:8.0f} routes/s "
+          f"({len(pairs)} routes, mean {cells / max(1, len(pairs)):.0f} cells)")
+
+    coordinator = RouteCoordinator(planner)
+    robots = random_free_cells(planner, rng, args.cooperative)
+    for robot_id, cell in enumerate(robots):
+        coordinator.place(robot_id, cell)
+    goals = random_free_cells(planner, rng, len(robots))
+    summaries, elapsed = timed(lambda: [coordinator.plan(robot_id, goal, "1.5 m/s")
+                                        for robot_id, goal in enumerate(goals)])
+    planned = [summary for summary in summaries if summary]
+    waited = sum(summary["wait_s"] for summary in planned)
+    cooperative_rate = len(robots) / max(elapsed, 1e-9)
+    print(f"  cooperative     {cooperative_rate:8.0f} routes/s "
+          f"({len(planned)}/{len(robots)} planned, {waited:.0f}s waiting in total, "
+          f"{coordinator.expansions / max(1, len(robots)):.0f} expansions per route)")
+    conflict = coordinator.conflicts()
+    # Hold up one robot in ten part way along and replan around it
+    coordinator.advance(5.0)
+    delayed = [robot_id for robot_id in sorted(coordinator.routes) if robot_id % 10 == 0]
+    _, elapsed = timed(lambda: [coordinator.delay(robot_id, rng.randint(4, 40)) for robot_id in delayed])
+    print(f"  delays          {len(delayed) / max(elapsed, 1e-9):8.0f} delays/s ({len(delayed)} robots held up)")
+    conflict = conflict or coordinator.conflicts()
+    if conflict is not None:
+        print(f"❌ Two robots on cell {conflict[1]} at step {conflict[0]}")
+        sys.exit(1)
+
+    if zone_rate < args.min_rate:
+        print(f"❌ Zone routing below {args.min_rate:.0f} routes/s")
+        sys.exit(1)
+    # Every robot replanned within --route-ticks ticks
+    tick_rate = len(robots) * args.tick_hz / args.route_ticks
+    if robots and cooperative_rate < tick_rate:
+        print(f"❌ Cooperative planning below {tick_rate:.0f} routes/s, needed for {len(robots)} robots "
+              f"each routed every {args.route_ticks:g} ticks at {args.tick_hz:g} Hz")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# bench_vector_fleet.py - Measure vectorized simulation ticks for a large fleet
+#
+# Usage: python benchmarks/bench_vector_fleet.py [--robots 100000] [--ticks 200]
+#                                                [--hz 10] [--seed 7]
+# Needs NumPy. Idle robots are given new work every tick (low-battery ones
+# are sent to charge), so most of the fleet stays busy. Exits non-zero if
+# the mean tick takes longer than one period at --hz.
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fleet_store import LOW_BATTERY_THRESHOLD  # noqa: E402
+from vector_fleet import (  # noqa: E402
+    CHARGE, IDLE, INSPECTING, MAINTENANCE, MOVING, PICKING, VectorFleet, np
+)
+
+
+def hand_out_work(fleet, rng, max_travel):
+    """Send low-battery robots to charge and give the other idle robots a
+    random task."""
+    low = np.flatnonzero(((fleet.status == IDLE) | (fleet.status == MAINTENANCE))
+                         & (fleet.battery < LOW_BATTERY_THRESHOLD + 10))
+    fleet.assign(low, CHARGE, rng.integers(0, max_travel + 1, low.size))
+    idle = fleet.indexes_with_status(IDLE)
+    kinds = rng.choice([PICKING, MOVING, INSPECTING], idle.size)
+    for kind in (PICKING, MOVING, INSPECTING):
+        chosen = idle[kinds == kind]
+        fleet.assign(chosen, kind, rng.integers(0, max_travel + 1, chosen.size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--robots", type=int, default=100000)
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--hz", type=float, default=10.0, help="tick rate the fleet must keep up with")
+    parser.add_argument("--max-travel", type=int, default=20, help="most ticks of driving to a task")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    fleet = VectorFleet(args.robots, seed=args.seed)
+    fleet.battery[:] = rng.integers(30, 101, args.robots)
+
+    step_time = 0.0
+    dispatch_time = 0.0
+    for _ in range(args.ticks):
+        started = time.perf_counter()
+        hand_out_work(fleet, rng, args.max_travel)
+        dispatch_time += time.perf_counter() - started
+        started = time.perf_counter()
+        fleet.step()
+        step_time += time.perf_counter() - started
+
+    step_ms = step_time / args.ticks * 1000
+    budget_ms = 1000 / args.hz
+    print(f"{args.robots} robots, {args.ticks} ticks")
+    print(f"  step            {step_ms:8.2f} ms/tick ({1000 / step_ms:.0f} ticks/s)")
+    print(f"  hand out work   {dispatch_time / args.ticks * 1000:8.2f} ms/tick")
+    print(f"  statuses        {fleet.status_counts()}")
+    print(f"  tasks completed {int(fleet.tasks_completed.sum())}, items {fleet.items_total}")
+    print(f"  energy          {fleet.energy_used} used, {fleet.energy_charged} charged, "
+          f"mean battery {fleet.average_battery():.1f}%")
+    if step_ms > budget_ms:
+        print(f"❌ Mean tick over the {budget_ms:.0f} ms budget for {args.hz:g} Hz")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# stress_concurrency.py - Hammer the API from many threads and check state invariants
+#
+# Usage: python benchmarks/stress_concurrency.py [--threads 16] [--requests 400]
+# Exits non-zero if any invariant is violated.
+import argparse
+import os
+import random
+import sys
+import threading
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402
+from fleet_store import LOW_BATTERY_THRESHOLD  # noqa: E402
+
+CONTROL_OK = {"started", "stopped", "emergency", "resumed"}
+
+
+def check_fleet_indexes(fleet):
+    errors = []
+    robots = list(fleet)
+    if fleet.battery_total != sum(r.battery for r in robots):
+        errors.append("battery_total out of sync")
+    if fleet.low_battery_count != sum(r.battery < LOW_BATTERY_THRESHOLD for r in robots):
+        errors.append("low_battery_count out of sync")
+    if fleet.status_counts() != dict(Counter(r.status for r in robots)):
+        errors.append(f"status index out of sync: {fleet.status_counts()}")
+    for robot in robots:
+        if robot.id not in fleet.ids_with_status(robot.status):
+            errors.append(f"robot {robot.id} missing from status index")
+        if robot.id not in fleet.ids_at_location(robot.location):
+            errors.append(f"robot {robot.id} missing from location index")
+    return errors
+
+
+def check_robot_view(robot):
+    # An emergency-halted robot is written in one update; seeing only part
+    # of it means a torn read
+    halted = (robot["status"], robot["color"]) == ("maintenance", "#DC2626")
+    if (robot["task"] == "EMERGENCY STOP") != halted:
+        return f"torn robot state: {robot}"
+    return None
+
+
+class Worker(threading.Thread):
+    def __init__(self, requests, seed):
+        super().__init__(daemon=True)
+        self.requests = requests
+        self.rng = random.Random(seed)
+        self.sent = 0
+        self.assigned = 0
+        self.queued = 0
+        self.control_ok = 0
+        self.ai_emergencies = 0
+        self.errors = []
+
+    def run(self):
+        client = main.app.test_client()
+        last_version = 0
+        for _ in range(self.requests):
+            roll = self.rng.random()
+            self.sent += 1
+            if roll < 0.35:
+                data = client.get("/api/robots").get_json()
+                if data["version"] < last_version:
+                    self.errors.append(f"fleet version went backwards: {data['version']} < {last_version}")
+                last_version = data["version"]
+                for robot in data["robots"]:
+                    error = check_robot_view(robot)
+                    if error:
+                        self.errors.append(error)
+            elif roll < 0.45:
+                client.get("/api/analytics")
+            elif roll < 0.75:
+                response = client.post("/api/task/assign", json={
+                    "robot_id": self.rng.randint(1, 4),
+                    "task_type": self.rng.choice(["pick", "move", "charge", "inspect"])
+                }).get_json()
+                if response.get("queued"):
+                    self.queued += 1
+                else:
+                    self.assigned += bool(response.get("success"))
+            elif roll < 0.8:
+                command = self.rng.choice(["charge beta", "emergency stop", "status"])
+                client.post("/api/ai/command", json={"command": command})
+                self.ai_emergencies += command.startswith("emergency")
+            else:
+                action = self.rng.choice(["start", "stop", "emergency_stop", "clear_emergency", "clear_emergency"])
+                response = client.post("/api/simulation/control", json={"action": action}).get_json()
+                self.control_ok += response.get("status") in CONTROL_OK
+
+
+def check_emergency_halt(stop_event, errors):
+    """While emergency mode is set, every robot must be halted."""
+    while not stop_event.is_set():
+        with main.state_lock:
+            if main.simulation.emergency_mode:
+                running = [r.id for r in main.fleet if r.task != "EMERGENCY STOP"]
+                if running:
+                    errors.append(f"robots {running} not halted during emergency")
+        stop_event.wait(0.001)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Concurrent API stress test with invariant checks")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400, help="requests per thread")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # Force frequent thread switches to expose races
+    sys.setswitchinterval(1e-6)
+
+    engine = main.SimulationEngine(main.simulation_tick, 200)
+    engine.start()
+
+    api_calls_before = main.simulation.api_calls.value
+    history_before = main.simulation.task_history.total_recorded
+    pending_before = len(main.scheduler)
+    next_task_id_before = main.scheduler.next_id
+    expired_before = main.scheduler.expired
+
+    stop_event = threading.Event()
+    checker_errors = []
+    checker = threading.Thread(target=check_emergency_halt, args=(stop_event, checker_errors), daemon=True)
+    checker.start()
+
+    workers = [Worker(args.requests, args.seed + i) for i in range(args.threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    stop_event.set()
+    checker.join()
+    engine.stop()
+
+    errors = checker_errors + [error for worker in workers for error in worker.errors]
+    sent = sum(w.sent for w in workers)
+    if main.simulation.api_calls.value - api_calls_before != sent:
+        errors.append(f"api_calls lost increments: {main.simulation.api_calls.value - api_calls_before} != {sent}")
+
+    # Queued tasks are recorded when the engine dispatches them. Besides the
+    # API's, they include work a robot was interrupted in when sent to charge
+    submitted = main.scheduler.next_id - next_task_id_before
+    if submitted < sum(w.queued for w in workers):
+        errors.append(f"{sum(w.queued for w in workers)} tasks queued but only {submitted} submitted")
+    dispatched = (pending_before + submitted - len(main.scheduler)
+                  - (main.scheduler.expired - expired_before))
+    expected_history = sum(w.assigned + w.control_ok + w.ai_emergencies for w in workers) + dispatched
+    if main.simulation.task_history.total_recorded - history_before != expected_history:
+        errors.append(f"task history has {main.simulation.task_history.total_recorded - history_before} entries, "
+                      f"expected {expected_history}")
+
+    with main.state_lock:
+        errors.extend(check_fleet_indexes(main.fleet))
+
+    print(f"{sent} requests from {args.threads} threads, {engine.tick_count} engine ticks")
+    if errors:
+        for error in errors[:20]:
+            print(f"❌ {error}")
+        print(f"{len(errors)} invariant violation(s)")
+        return 1
+    print("✅ All invariants held")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
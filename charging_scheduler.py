@@ -0,0 +1,168 @@
+# charging_scheduler.py - Predictive charger bookings
+import math
+
+from spatial_index import SpatialIndex
+
+
+class ChargingScheduler:
+    """Books time on a fixed set of chargers before robots run low.
+
+    Time is counted in simulation ticks. Each robot's battery drain per tick
+    is tracked as a moving average, and from it (plus the battery its queued
+    tasks will use) the scheduler predicts the tick its battery falls to
+    ``low_battery``. Once that is within ``lookahead`` ticks, the robot is
+    booked on a charger: the slot starting as late as possible but no later
+    than the predicted tick, on one of the ``candidates`` nearest chargers.
+    A charger holds one robot and its slots never overlap, so a robot that
+    leaves when its booking says finds its charger free. A booking is kept
+    until the predicted tick moves ``rebook_slack`` ticks earlier than both
+    its start and the tick predicted when it was made, so a robot that
+    could only get a late slot isn't rebooked every tick.
+    """
+
+    def __init__(self, chargers, low_battery=20, full_battery=95, default_drain=2.0,
+                 default_charge_rate=10.0, lookahead=30, candidates=8, rebook_slack=5, bucket_size=16):
+        self.chargers = [tuple(charger) for charger in chargers]
+        # Chargers by position, for the nearest ``candidates`` to a robot
+        self._index = SpatialIndex(bucket_size)
+        for charger in self.chargers:
+            self._index.insert(charger, charger)
+        self.low_battery = low_battery
+        self.full_battery = full_battery
+        self.default_drain = default_drain
+        self.charge_rate = default_charge_rate
+        self.lookahead = lookahead
+        self.candidates = candidates
+        self.rebook_slack = rebook_slack
+        self.now = 0
+        # charger -> [(start, end, robot_id), ...] sorted by start
+        self._slots = {charger: [] for charger in self.chargers}
+        # robot id -> {"charger", "start", "end", "leave", "deadline"}
+        self.bookings = {}
+        self._drain = {}
+        self.booked_total = 0
+        self.late_total = 0
+
+    # ---------- Observations ----------
+    def observe_drain(self, robot_id, amount, weight=0.2):
+        rate = self._drain.get(robot_id, amount)
+        self._drain[robot_id] = rate + weight * (amount - rate)
+
+    def observe_charge(self, amount, weight=0.1):
+        self.charge_rate += weight * (amount - self.charge_rate)
+
+    def drain_rate(self, robot_id):
+        return self._drain.get(robot_id, self.default_drain)
+
+    # ---------- Prediction ----------
+    def ticks_until_low(self, robot_id, battery, queued_cost=0):
+        """Ticks of work left before the battery reaches ``low_battery``."""
+        spare = battery - queued_cost - self.low_battery
+        return max(0.0, spare / max(self.drain_rate(robot_id), 1e-6))
+
+    def charge_ticks(self):
+        """Slot length: long enough to charge from ``low_battery`` to full."""
+        return max(1, math.ceil((self.full_battery - self.low_battery) / max(self.charge_rate, 1e-6)))
+
+    def needs_booking(self, robot_id, battery, queued_cost=0):
+        """Whether a robot should be booked: it will run low within the
+        lookahead and has no booking, or it is now predicted to run low
+        well before its booking starts (and before it was predicted to
+        when booked)."""
+        ticks = self.ticks_until_low(robot_id, battery, queued_cost)
+        booking = self.bookings.get(robot_id)
+        if booking is None:
+            return ticks <= self.lookahead
+        return self.now + ticks < min(booking["start"], booking["deadline"]) - self.rebook_slack
+
+    # ---------- Booking ----------
+    def nearest_chargers(self, cell):
+        return [charger for _, charger, _ in self._index.nearest(cell, self.candidates)]
+
+    def _latest_start(self, charger, earliest, latest, length):
+        """Latest start in ``[earliest, latest]`` of a free run of
+        ``length`` ticks on ``charger``, else the earliest start after
+        ``latest``."""
+        best = None
+        start = earliest
+        for slot_start, slot_end, _ in self._slots[charger] + [(math.inf, math.inf, None)]:
+            if slot_end <= start:
+                continue
+            # Free run [start, slot_start)
+            if slot_start - start >= length:
+                if start > latest:
+                    return best if best is not None else start
+                best = min(slot_start - length, latest)
+            start = max(start, slot_end)
+        return best
+
+    def book(self, robot_id, cell, battery, travel_ticks, queued_cost=0, urgent=False):
+        """Book a charger slot for a robot at ``cell`` (the earliest one if
+        ``urgent``). ``travel_ticks`` maps a charger to the ticks needed to
+        drive there, or None if it can't be reached. Returns the booking,
+        or None."""
+        self.cancel(robot_id)
+        deadline = self.now if urgent else self.now + self.ticks_until_low(robot_id, battery, queued_cost)
+        length = self.charge_ticks()
+        best = None
+        for charger in self.nearest_chargers(cell):
+            travel = travel_ticks(charger)
+            if travel is None:
+                continue
+            earliest = self.now + travel
+            start = self._latest_start(charger, earliest, max(earliest, math.floor(deadline)), length)
+            # On time beats late; then later starts (more work done) on
+            # nearer chargers
+            key = (start > deadline, start if start > deadline else -start, travel)
+            if best is None or key < best[0]:
+                best = (key, charger, start, travel)
+        if best is None:
+            return None
+
+        _, charger, start, travel = best
+        booking = {"charger": charger, "start": start, "end": start + length, "leave": start - travel,
+                   "deadline": deadline}
+        slots = self._slots[charger]
+        slots.append((booking["start"], booking["end"], robot_id))
+        slots.sort()
+        self.bookings[robot_id] = booking
+        self.booked_total += 1
+        return booking
+
+    def cancel(self, robot_id):
+        booking = self.bookings.pop(robot_id, None)
+        if booking is not None:
+            self._slots[booking["charger"]].remove((booking["start"], booking["end"], robot_id))
+        return booking
+
+    def due(self, robot_id):
+        """Whether a booked robot should leave for its charger now."""
+        booking = self.bookings.get(robot_id)
+        return booking is not None and self.now >= booking["leave"]
+
+    def slot_over(self, robot_id):
+        booking = self.bookings.get(robot_id)
+        return booking is not None and self.now >= booking["end"]
+
+    def record_late(self):
+        """Count a robot that ran low before its charge."""
+        self.late_total += 1
+
+    def advance(self):
+        """Move on one tick. Bookings whose slot ended without the robot
+        releasing them are dropped."""
+        self.now += 1
+        for robot_id in [robot_id for robot_id, booking in self.bookings.items() if booking["end"] < self.now]:
+            self.cancel(robot_id)
+
+    def stats(self):
+        busy = sum(1 for slots in self._slots.values()
+                   if any(start <= self.now < end for start, end, _ in slots))
+        return {
+            "chargers": len(self.chargers),
+            "chargers_in_use": busy,
+            "bookings": len(self.bookings),
+            "booked_total": self.booked_total,
+            "ran_low_total": self.late_total,
+            "charge_rate_per_tick": round(self.charge_rate, 2)
+        }
@@ -0,0 +1,108 @@
+# command_jobs.py - Background execution of API commands with pollable job records
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class JobRunner:
+    """Runs submitted commands on a small worker pool and keeps a record of
+    each: its status (queued, running, done, failed or cancelled),
+    timestamps, and result or error.
+
+    ``on_update`` is called with a copy of a job's record whenever it
+    changes, outside the runner's lock (e.g. to push it to stream
+    subscribers). Only the most recent ``history`` jobs are kept.
+    """
+
+    def __init__(self, workers=4, history=1000, on_update=None):
+        self.history = history
+        self.on_update = on_update
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="command-job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+
+    def submit(self, kind, arguments, fn):
+        """Queue ``fn()`` as a job of ``kind`` (``arguments`` are recorded
+        with it). Returns the job record."""
+        with self._lock:
+            job = {
+                "id": next(self._ids),
+                "kind": kind,
+                "arguments": arguments,
+                "status": "queued",
+                "submitted": datetime.now().isoformat(),
+                "started": None,
+                "finished": None,
+                "result": None,
+                "error": None
+            }
+            self._jobs[job["id"]] = job
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+            record = dict(job)
+        self._notify(record)
+        self._executor.submit(self._run, job, fn)
+        return record
+
+    def _run(self, job, fn):
+        # Checked and claimed in one go, so a job cancel_queued gets to
+        # first never starts and one already running is never cancelled
+        with self._lock:
+            if job["status"] != "queued":
+                return
+            job.update(status="running", started=datetime.now().isoformat())
+            record = dict(job)
+        self._notify(record)
+        try:
+            result = fn()
+        except Exception as e:
+            self._update(job, status="failed", finished=datetime.now().isoformat(), error=str(e))
+        else:
+            self._update(job, status="done", finished=datetime.now().isoformat(), result=result)
+
+    def _update(self, job, **changes):
+        with self._lock:
+            job.update(changes)
+            record = dict(job)
+        self._notify(record)
+
+    def _notify(self, record):
+        if self.on_update is not None:
+            self.on_update(record)
+
+    def cancel_queued(self, reason):
+        """Mark every job not yet started as cancelled (with ``reason`` as
+        its error); the workers skip them. Returns how many were."""
+        with self._lock:
+            now = datetime.now().isoformat()
+            records = []
+            for job in self._jobs.values():
+                if job["status"] == "queued":
+                    job.update(status="cancelled", finished=now, error=reason)
+                    records.append(dict(job))
+        for record in records:
+            self._notify(record)
+        return len(records)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def recent(self, limit=20):
+        """The newest ``limit`` jobs, newest first."""
+        with self._lock:
+            return [dict(job) for job in itertools.islice(reversed(self._jobs.values()), limit)]
+
+    def counts(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return counts
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
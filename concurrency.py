@@ -0,0 +1,111 @@
+# concurrency.py - Thread-safe primitives shared by request handlers and the engine
+import threading
+from contextlib import contextmanager
+
+
+class AtomicCounter:
+    """Integer counter that never loses increments under concurrent updates.
+
+    ``counter += 1`` on a plain attribute is a read-modify-write and can drop
+    updates when Flask serves requests on several threads.
+    """
+
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self, value=0):
+        self._value = value
+        self._lock = threading.Lock()
+
+    def increment(self, amount=1):
+        with self._lock:
+            self._value += amount
+            return self._value
+
+    @property
+    def value(self):
+        return self._value
+
+    def __int__(self):
+        return self._value
+
+    def __repr__(self):
+        return f"AtomicCounter({self._value})"
+
+
+class PriorityRLock:
+    """Reentrant lock with a priority way in.
+
+    Threads waiting on a plain lock are woken in no particular order, so
+    under heavy load a thread can lose the race for it many times over.
+    While a thread waits in ``priority()``, ordinary ``acquire`` calls hold
+    back (except by threads that already own the lock, which must be able
+    to re-enter it), so the priority thread only waits for the current
+    holder and anyone already queued on the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._owner = None                  # ident of the thread holding the lock
+        self._depth = 0                     # how many times it holds it
+        self._open = threading.Event()      # cleared while a priority thread waits
+        self._open.set()
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+
+    def _owned(self):
+        # Only the owner ever sets _owner to its own ident, so no other
+        # thread can see a match
+        return self._owner == threading.get_ident()
+
+    def _reenter(self):
+        if not self._owned():
+            return False
+        self._depth += 1
+        return True
+
+    def _take(self, blocking=True, timeout=-1):
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        self._owner = threading.get_ident()
+        self._depth = 1
+        return True
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._reenter():
+            return True
+        if blocking:
+            self._open.wait()
+        return self._take(blocking, timeout)
+
+    def release(self):
+        if not self._owned():
+            raise RuntimeError("cannot release un-acquired lock")
+        self._depth -= 1
+        if not self._depth:
+            self._owner = None
+            self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    @contextmanager
+    def priority(self):
+        if not self._reenter():
+            with self._waiting_lock:
+                self._waiting += 1
+                self._open.clear()
+            try:
+                self._take()
+            finally:
+                with self._waiting_lock:
+                    self._waiting -= 1
+                    if not self._waiting:
+                        self._open.set()
+        try:
+            yield self
+        finally:
+            self.release()
@@ -0,0 +1,149 @@
+# event_log.py - Append-only event log with batched fsync and compacting snapshots
+import glob
+import json
+import os
+import queue
+import threading
+import time
+
+SNAPSHOT_FILE = "snapshot.json"
+SEGMENT_PATTERN = "events-*.log"
+
+
+class EventLog:
+    """Write-ahead log of state-change events on local disk.
+
+    Events are JSON lines tagged with a monotonic sequence number. A writer
+    thread appends them in batches and fsyncs once per batch, at most every
+    ``fsync_interval`` seconds. A snapshot records the full state up to a
+    sequence number; once it is on disk the log segments it covers are
+    deleted, so startup only replays the events after the latest snapshot.
+    """
+
+    def __init__(self, directory, fsync_interval=0.05):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self.seq = 0
+        self.snapshot_seq = 0
+        self._queue = queue.Queue()
+        self._segment = None
+        self._writer = None
+        self._closed = False
+
+    @property
+    def events_since_snapshot(self):
+        return self.seq - self.snapshot_seq
+
+    # ---------- Recovery ----------
+    def load(self):
+        """Read the latest snapshot and the events after it.
+
+        Returns ``(snapshot_state_or_None, events)`` and positions the log so
+        new events continue the sequence. Must be called before ``start``.
+        """
+        state = None
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            state = snapshot["state"]
+            self.snapshot_seq = self.seq = snapshot["seq"]
+
+        events = []
+        for path in self._segments():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash; nothing valid follows it
+                        break
+                    if event["seq"] > self.seq:
+                        events.append(event)
+                        self.seq = event["seq"]
+        return state, events
+
+    def _segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, SEGMENT_PATTERN)))
+
+    # ---------- Writing ----------
+    def start(self):
+        self._open_segment(self.seq + 1)
+        self._writer = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+        self._writer.start()
+
+    def append(self, event_type, data):
+        """Queue an event for writing and return its sequence number.
+        Callers serialise appends (the app holds its state lock)."""
+        self.seq += 1
+        self._queue.put(("event", json.dumps({"seq": self.seq, "type": event_type, "data": data})))
+        return self.seq
+
+    def write_snapshot(self, state):
+        """Queue a snapshot of ``state`` as of the latest appended event."""
+        self.snapshot_seq = self.seq
+        self._queue.put(("snapshot", self.seq, state))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(("close",))
+        if self._writer is not None:
+            self._writer.join()
+
+    def _open_segment(self, first_seq):
+        path = os.path.join(self.directory, f"events-{first_seq:012d}.log")
+        self._segment = open(path, "a", encoding="utf-8")
+
+    def _run(self):
+        last_sync = 0.0
+        while True:
+            batch = [self._queue.get()]
+            # Let events accumulate so one fsync covers the whole batch
+            wait = self.fsync_interval - (time.monotonic() - last_sync)
+            if wait > 0:
+                time.sleep(wait)
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for item in batch:
+                kind = item[0]
+                if kind == "event":
+                    self._segment.write(item[1] + "\n")
+                elif kind == "snapshot":
+                    self._sync()
+                    self._write_snapshot(item[1], item[2])
+                elif kind == "close":
+                    self._sync()
+                    self._segment.close()
+                    return
+            self._sync()
+            last_sync = time.monotonic()
+
+    def _sync(self):
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+
+    def _write_snapshot(self, seq, state):
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"seq": seq, "state": state}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        # Everything up to seq is now in the snapshot; start a fresh segment
+        # and drop the old ones
+        old_segments = self._segments()
+        self._segment.close()
+        self._open_segment(seq + 1)
+        for old in old_segments:
+            if old != self._segment.name:
+                os.remove(old)
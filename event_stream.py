@@ -0,0 +1,86 @@
+# event_stream.py - Server-Sent Events broadcaster for live dashboard updates
+import json
+import queue
+import threading
+
+
+class EventBroadcaster:
+    """Fans state-change events out to every connected SSE subscriber.
+
+    Each subscriber gets a small bounded queue. Events carry full state, so a
+    slow subscriber just drops its oldest pending event instead of blocking
+    the publisher.
+    """
+
+    def __init__(self, max_queue_size=32, heartbeat_interval=15.0):
+        self.max_queue_size = max_queue_size
+        self.heartbeat_interval = heartbeat_interval
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._latest = {}
+        self._latest_keys = {}
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def subscribe(self):
+        subscription = queue.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            # New subscribers start from the current state of every event
+            for event, payload in self._latest.items():
+                subscription.put_nowait((event, payload))
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event, data, key=None, payload=None):
+        """Push an event to all subscribers.
+
+        ``key`` identifies the state the event represents; when it matches the
+        previous key for the same event nothing is sent. Without a key the
+        encoded payload itself is compared. ``payload`` is ``data`` already
+        encoded as JSON, for callers that have it.
+        """
+        if payload is None:
+            payload = json.dumps(data)
+        change_key = payload if key is None else key
+        with self._lock:
+            if event in self._latest_keys and self._latest_keys[event] == change_key:
+                return False
+            self._latest_keys[event] = change_key
+            self._latest[event] = payload
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            self._offer(subscription, (event, payload))
+        return True
+
+    def _offer(self, subscription, item):
+        while True:
+            try:
+                subscription.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    subscription.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def stream(self, subscription):
+        """Yield SSE-formatted messages until the client disconnects."""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event, payload = subscription.get(timeout=self.heartbeat_interval)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {payload}\n\n"
+        finally:
+            self.unsubscribe(subscription)
@@ -0,0 +1,177 @@
+# fleet_store.py - Compact, indexed robot fleet store
+from collections import defaultdict
+
+LOW_BATTERY_THRESHOLD = 20
+
+
+class Robot:
+    """A single robot record. Slots keep per-robot memory small at large
+    fleet sizes."""
+
+    __slots__ = (
+        "id", "name", "status", "battery", "location", "task",
+        "type", "speed", "color", "tasks_completed", "row", "col"
+    )
+
+    def __init__(self, id, name, status, battery, location, task,
+                 type, speed, color, tasks_completed=0, row=None, col=None):
+        self.id = id
+        self.name = name
+        self.status = status
+        self.battery = battery
+        self.location = location
+        self.task = task
+        self.type = type
+        self.speed = speed
+        self.color = color
+        self.tasks_completed = tasks_completed
+        # Grid position on the warehouse floor
+        self.row = row
+        self.col = col
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class FleetStore:
+    """Holds every robot plus its task execution entry.
+
+    Lookups by id and name are O(1). Secondary indexes by status and location,
+    status counts and battery aggregates are maintained on every mutation, so
+    reads never scan the fleet. All mutations must go through ``update`` /
+    ``set_task_execution`` / ``update_task_execution`` to keep them in sync.
+    """
+
+    def __init__(self, robots=(), task_execution=None):
+        self._robots = {}
+        self._by_name = {}
+        self._by_status = defaultdict(set)
+        self._by_location = defaultdict(set)
+        self.battery_total = 0
+        self.low_battery_count = 0
+        self.task_execution = {}
+
+        # Published dict copies, rebuilt only for entries that changed
+        self._robot_dicts = {}
+        self._task_dicts = {}
+        self._dirty_robots = set()
+        self._dirty_tasks = set()
+
+        for robot in robots:
+            self.add(robot)
+        for robot_id, data in (task_execution or {}).items():
+            self.set_task_execution(robot_id, data)
+
+    def __len__(self):
+        return len(self._robots)
+
+    def __iter__(self):
+        return iter(list(self._robots.values()))
+
+    def __contains__(self, robot_id):
+        return robot_id in self._robots
+
+    # ---------- Lookups ----------
+    def get(self, robot_id):
+        return self._robots.get(robot_id)
+
+    def find_by_name(self, name):
+        robot_id = self._by_name.get(name.lower())
+        return self._robots.get(robot_id) if robot_id is not None else None
+
+    def names(self):
+        return [robot.name for robot in self._robots.values()]
+
+    def ids(self):
+        return list(self._robots)
+
+    def ids_with_status(self, status):
+        return set(self._by_status.get(status, ()))
+
+    def ids_at_location(self, location):
+        return set(self._by_location.get(location, ()))
+
+    def count_with_status(self, status):
+        return len(self._by_status.get(status, ()))
+
+    def status_counts(self):
+        return {status: len(ids) for status, ids in self._by_status.items() if ids}
+
+    def average_battery(self):
+        return self.battery_total / len(self._robots) if self._robots else 0
+
+    # ---------- Mutations ----------
+    def add(self, data):
+        robot = data if isinstance(data, Robot) else Robot(**data)
+        if robot.id in self._robots:
+            raise ValueError(f"Duplicate robot id {robot.id}")
+        self._robots[robot.id] = robot
+        self._by_name[robot.name.lower()] = robot.id
+        self._by_status[robot.status].add(robot.id)
+        self._by_location[robot.location].add(robot.id)
+        self.battery_total += robot.battery
+        if robot.battery < LOW_BATTERY_THRESHOLD:
+            self.low_battery_count += 1
+        self._dirty_robots.add(robot.id)
+        return robot
+
+    def update(self, robot_id, **changes):
+        """Apply field changes to one robot, keeping indexes and aggregates
+        current. Returns True if anything actually changed."""
+        robot = self._robots[robot_id]
+        changed = False
+        for field, value in changes.items():
+            old = getattr(robot, field)
+            if old == value:
+                continue
+            changed = True
+            if field == "status":
+                self._by_status[old].discard(robot_id)
+                self._by_status[value].add(robot_id)
+            elif field == "location":
+                self._by_location[old].discard(robot_id)
+                self._by_location[value].add(robot_id)
+            elif field == "battery":
+                self.battery_total += value - old
+                self.low_battery_count += (value < LOW_BATTERY_THRESHOLD) - (old < LOW_BATTERY_THRESHOLD)
+            elif field == "name":
+                del self._by_name[old.lower()]
+                self._by_name[value.lower()] = robot_id
+            elif field == "id":
+                raise ValueError("Robot id cannot be changed")
+            setattr(robot, field, value)
+
+        if changed:
+            self._dirty_robots.add(robot_id)
+        return changed
+
+    def set_task_execution(self, robot_id, data):
+        self.task_execution[robot_id] = dict(data)
+        self._dirty_tasks.add(robot_id)
+
+    def update_task_execution(self, robot_id, **changes):
+        entry = self.task_execution[robot_id]
+        if any(entry.get(key) != value for key, value in changes.items()):
+            entry.update(changes)
+            self._dirty_tasks.add(robot_id)
+
+    # ---------- Publishing ----------
+    def publish(self):
+        """Refresh the published dict copies of entries changed since the
+        last publish and return them as ``(robots, task_execution)`` dicts
+        keyed by robot id."""
+        changed_robots = {}
+        for robot_id in self._dirty_robots:
+            changed_robots[robot_id] = self._robot_dicts[robot_id] = self._robots[robot_id].to_dict()
+        changed_tasks = {}
+        for robot_id in self._dirty_tasks:
+            changed_tasks[robot_id] = self._task_dicts[robot_id] = dict(self.task_execution[robot_id])
+        self._dirty_robots.clear()
+        self._dirty_tasks.clear()
+        return changed_robots, changed_tasks
+
+    def published_robots(self):
+        return list(self._robot_dicts.values())
+
+    def published_task_execution(self):
+        return dict(self._task_dicts)
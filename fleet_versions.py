@@ -0,0 +1,72 @@
+# fleet_versions.py - Monotonic fleet versioning for delta updates
+import threading
+
+_MISSING = object()
+
+
+class FleetVersions:
+    """Tracks which entries changed at which fleet version.
+
+    Every commit that changes at least one entry bumps the fleet version once
+    and stamps the changed entries with it, so a client holding version ``v``
+    only needs the entries stamped after ``v``.
+    """
+
+    def __init__(self, start_version=0):
+        self.version = start_version
+        self._lock = threading.Lock()
+        # kind -> key -> (version, value)
+        self._entries = {}
+
+    def commit(self, **collections):
+        """Record the current value of every entry, e.g.
+        ``commit(robots={1: {...}}, task_execution={1: {...}})``.
+
+        Returns the fleet version after the commit.
+        """
+        with self._lock:
+            changed = []
+            for kind, items in collections.items():
+                entries = self._entries.setdefault(kind, {})
+                for key, value in items.items():
+                    current = entries.get(key, (0, _MISSING))[1]
+                    if current != value:
+                        changed.append((entries, key, value))
+
+            if changed:
+                self.version += 1
+                for entries, key, value in changed:
+                    entries[key] = (self.version, value)
+            return self.version
+
+    def changes_since(self, since):
+        """Return ``(version, {kind: {key: value}})`` for entries newer than
+        ``since``."""
+        with self._lock:
+            changes = {
+                kind: {key: value for key, (version, value) in entries.items() if version > since}
+                for kind, entries in self._entries.items()
+            }
+            return self.version, changes
+
+    def entries(self):
+        """``(version, {kind: {key: (version, value)}})``: everything needed
+        to seed a replica with ``load``."""
+        with self._lock:
+            return self.version, {kind: dict(entries) for kind, entries in self._entries.items()}
+
+    def load(self, version, entries):
+        """Replace this tracker's state with ``entries()`` from another."""
+        with self._lock:
+            self.version = version
+            self._entries = {kind: dict(items) for kind, items in entries.items()}
+
+    def apply(self, version, **collections):
+        """Stamp entries with a version committed by another tracker, so a
+        replica hands out the same versions and deltas as its source."""
+        with self._lock:
+            for kind, items in collections.items():
+                entries = self._entries.setdefault(kind, {})
+                for key, value in items.items():
+                    entries[key] = (version, value)
+            self.version = max(self.version, version)
@@ -0,0 +1,329 @@
+# headless.py - Run fleet scenarios without the server, on a simulated clock
+#
+# Usage: python headless.py SCENARIO.json [...] [--workers 4] [--output results.json]
+#
+# A scenario file holds one scenario, a list of them, or a sweep:
+#   {"base": {...}, "sweep": {"robots": [10, 20], "task_rate_per_min": [5, 10]}}
+# which expands to every combination of the swept values over ``base``.
+import argparse
+import importlib.util
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from fleet_store import FleetStore
+from warehouse_map import DEFAULT_LAYOUT_PATH
+
+LAYOUT_DIR = os.path.dirname(DEFAULT_LAYOUT_PATH)
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+# Simulated runs start at this instant, so deadlines replay identically
+SIMULATED_EPOCH = datetime(2024, 1, 1).timestamp()
+
+SCENARIO_DEFAULTS = {
+    "name": None,
+    "robots": 4,                # fleet size; the first four are the server's default robots
+    "layout": None,             # file in layouts/ (or a path, from the CLI); None for the default floor
+    "duration_s": 3600.0,       # simulated seconds
+    "tick_hz": 1.0,             # simulated ticks per second
+    "task_rate_per_min": 6.0,   # mean task arrivals per simulated minute (Poisson)
+    "task_mix": {"pick": 0.5, "move": 0.3, "inspect": 0.2},
+    "deadline_s": None,         # tasks still queued this long after arrival are dropped
+    "battery": [60, 100],       # initial battery range
+    "seed": 0
+}
+
+
+def resolve_layout(layout, allow_paths=True):
+    """The layout file for a scenario's ``layout``: a file in layouts/ by
+    name, or (if ``allow_paths``) any existing path. Raises ValueError."""
+    if layout is None:
+        return None
+    name = layout if layout.endswith(".json") else layout + ".json"
+    if os.path.basename(name) == name and os.path.isfile(os.path.join(LAYOUT_DIR, name)):
+        return os.path.join(LAYOUT_DIR, name)
+    if allow_paths and os.path.isfile(layout):
+        return os.path.abspath(layout)
+    raise ValueError(f"Unknown layout '{layout}'")
+
+
+def normalize_scenario(data, index=0, allow_paths=True):
+    """A scenario with defaults filled in and values checked. Raises
+    ValueError."""
+    if not isinstance(data, dict):
+        raise ValueError("A scenario must be an object")
+    unknown = set(data) - set(SCENARIO_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown scenario keys: {', '.join(sorted(unknown))}")
+    scenario = dict(SCENARIO_DEFAULTS, **data)
+    try:
+        scenario["robots"] = int(scenario["robots"])
+        scenario["seed"] = int(scenario["seed"])
+        for key in ("duration_s", "tick_hz", "task_rate_per_min"):
+            scenario[key] = float(scenario[key])
+        if scenario["deadline_s"] is not None:
+            scenario["deadline_s"] = float(scenario["deadline_s"])
+        low, high = (int(value) for value in scenario["battery"])
+        mix = {task_type: float(weight) for task_type, weight in scenario["task_mix"].items()}
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError("Scenario values have the wrong type")
+    if scenario["robots"] < 1 or scenario["duration_s"] <= 0 or scenario["tick_hz"] <= 0:
+        raise ValueError("robots, duration_s and tick_hz must be positive")
+    if scenario["task_rate_per_min"] < 0 or not 0 <= low <= high <= 100:
+        raise ValueError("task_rate_per_min must be >= 0 and battery a range within 0-100")
+    if set(mix) - {"pick", "move", "inspect"} or not mix or min(mix.values()) < 0 or not sum(mix.values()):
+        raise ValueError("task_mix weighs pick, move and inspect tasks")
+    scenario["battery"] = [low, high]
+    scenario["task_mix"] = mix
+    scenario["layout"] = resolve_layout(scenario["layout"], allow_paths)
+    if scenario["name"] is None:
+        scenario["name"] = f"scenario-{index + 1}"
+    return scenario
+
+
+def expand_scenarios(data, allow_paths=True):
+    """The scenarios described by a scenario file's contents (one, a list,
+    or a base plus sweep), normalized. Raises ValueError."""
+    if isinstance(data, dict) and "sweep" in data:
+        base = data.get("base", {})
+        sweep = data["sweep"]
+        if not isinstance(base, dict) or not isinstance(sweep, dict) or not sweep:
+            raise ValueError("A sweep needs a 'sweep' object of value lists")
+        keys = sorted(sweep)
+        if not all(isinstance(sweep[key], list) and sweep[key] for key in keys):
+            raise ValueError("Every swept key needs a non-empty list of values")
+        raw = []
+        for values in itertools.product(*(sweep[key] for key in keys)):
+            scenario = dict(base, **dict(zip(keys, values)))
+            suffix = ",".join(f"{key}={value}" for key, value in zip(keys, values))
+            scenario["name"] = f"{base.get('name') or 'sweep'}[{suffix}]"
+            raw.append(scenario)
+    elif isinstance(data, list):
+        raw = data
+    else:
+        raw = [data]
+    if not raw:
+        raise ValueError("No scenarios given")
+    return [normalize_scenario(scenario, index, allow_paths) for index, scenario in enumerate(raw)]
+
+
+class SimulatedClock:
+    """Stands in for ``time.time``; the run moves it on one tick at a time."""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FleetMeter:
+    """Totals what happens to the fleet tick by tick: battery drained and
+    charged, items handled, tasks completed, time spent in each status and
+    queue lengths."""
+
+    ITEM_FIELDS = {"items_picked": "picked", "items_moved": "moved", "items_inspected": "inspected"}
+
+    def __init__(self, fleet):
+        self.fleet = fleet
+        self.battery_used = 0
+        self.battery_charged = 0
+        self.items = {name: 0 for name in self.ITEM_FIELDS.values()}
+        self.status_ticks = {}
+        self.queue_total = 0
+        self.queue_max = 0
+        self.samples = 0
+        self._battery = {robot.id: robot.battery for robot in fleet}
+        self._tasks = {robot_id: (data, self._counts(data)) for robot_id, data in fleet.task_execution.items()}
+        self._completed = sum(robot.tasks_completed for robot in fleet)
+
+    def _counts(self, data):
+        return {field: data.get(field, 0) for field in self.ITEM_FIELDS}
+
+    def sample(self, queue_length):
+        for robot in self.fleet:
+            change = robot.battery - self._battery[robot.id]
+            if change < 0:
+                self.battery_used -= change
+            else:
+                self.battery_charged += change
+            self._battery[robot.id] = robot.battery
+            self.status_ticks[robot.status] = self.status_ticks.get(robot.status, 0) + 1
+
+        for robot_id, data in self.fleet.task_execution.items():
+            counts = self._counts(data)
+            previous = self._tasks.get(robot_id)
+            # A new task starts a new execution entry, with counts from 0
+            before = previous[1] if previous is not None and previous[0] is data else {}
+            for field, name in self.ITEM_FIELDS.items():
+                self.items[name] += counts[field] - before.get(field, 0)
+            self._tasks[robot_id] = (data, counts)
+
+        self.queue_total += queue_length
+        self.queue_max = max(self.queue_max, queue_length)
+        self.samples += 1
+
+    def tasks_completed(self):
+        return sum(robot.tasks_completed for robot in self.fleet) - self._completed
+
+
+def load_model():
+    """A fresh copy of the server module (main.py), with its own fleet,
+    planner and tick, whether or not the server is already imported."""
+    spec = importlib.util.spec_from_file_location("headless_model", MODEL_PATH)
+    model = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(model)
+    return model
+
+
+def build_fleet(model, scenario, rng):
+    """Replace the server's fleet with the scenario's: the default robots
+    first, then copies of them on random free cells, all idle with random
+    battery."""
+    for robot in model.fleet:
+        model.coordinator.cancel(robot.id)
+    low, high = scenario["battery"]
+    templates = model.DEFAULT_ROBOTS
+    robots = []
+    for index in range(scenario["robots"]):
+        template = templates[index % len(templates)]
+        robot = dict(template, status='idle', task='Ready for task', battery=rng.randint(low, high),
+                     color='#3B82F6', tasks_completed=0)
+        if index >= len(templates):
+            while True:
+                cell = (rng.randrange(model.planner.rows), rng.randrange(model.planner.cols))
+                if model.planner.is_passable(cell):
+                    break
+            robot.update(id=index + 1, name=f"{template['name']}-{index + 1}", location='Floor',
+                         row=cell[0], col=cell[1])
+        robots.append(robot)
+    model.fleet = FleetStore(robots)
+    model.position_robots()
+
+
+def run_scenario(scenario):
+    """Run one normalized scenario in this process and return its metrics.
+
+    The run drives the server's own fleet model (``simulation_tick`` in
+    main.py: routing, charging, task queues) as fast as it will go, with
+    the clock moved on one tick period per tick, and persistence off. The
+    scenario's seed seeds every random stream. It sets the configuration
+    environment, so it needs a process of its own; use ``run_scenarios``.
+    """
+    os.environ["ROBOFLEET_DATA_DIR"] = ""
+    os.environ["ROBOFLEET_TICK_HZ"] = str(scenario["tick_hz"])
+    os.environ["ROBOFLEET_LAYOUT"] = scenario["layout"] or ""
+    os.environ["ROBOFLEET_SEED"] = str(scenario["seed"])
+    model = load_model()
+
+    # Fleet setup and task arrivals draw from streams of their own
+    rng = model.streams.stream("headless")
+    clock = SimulatedClock(SIMULATED_EPOCH)
+    model.clock = clock
+    build_fleet(model, scenario, rng)
+    meter = FleetMeter(model.fleet)
+    model.simulation.is_running = True
+
+    tick_s = 1.0 / scenario["tick_hz"]
+    ticks = max(1, round(scenario["duration_s"] * scenario["tick_hz"]))
+    rate_per_s = scenario["task_rate_per_min"] / 60.0
+    task_types = sorted(scenario["task_mix"])
+    weights = [scenario["task_mix"][task_type] for task_type in task_types]
+    next_arrival = clock.now + rng.expovariate(rate_per_s) if rate_per_s else None
+    submitted = 0
+
+    started = time.perf_counter()
+    for _ in range(ticks):
+        with model.state_lock:
+            while next_arrival is not None and next_arrival <= clock.now:
+                deadline = None
+                if scenario["deadline_s"] is not None:
+                    deadline = datetime.fromtimestamp(next_arrival + scenario["deadline_s"]).isoformat()
+                model.scheduler.submit(rng.choices(task_types, weights)[0], deadline=deadline)
+                submitted += 1
+                next_arrival += rng.expovariate(rate_per_s)
+        model.simulation_tick()
+        clock.now += tick_s
+        meter.sample(len(model.scheduler))
+    wall_s = time.perf_counter() - started
+
+    simulated_s = ticks * tick_s
+    hours = simulated_s / 3600
+    completed = meter.tasks_completed()
+    items = sum(meter.items.values())
+    robot_ticks = max(1, sum(meter.status_ticks.values()))
+    return {
+        "name": scenario["name"],
+        "scenario": scenario,
+        "ticks": ticks,
+        "simulated_s": simulated_s,
+        "wall_s": round(wall_s, 3),
+        "speedup": round(simulated_s / max(wall_s, 1e-9), 1),
+        "tasks": {
+            "submitted": submitted,
+            "completed": completed,
+            "expired": model.scheduler.expired,
+            "per_hour": round(completed / hours, 1)
+        },
+        "items": meter.items,
+        "items_per_hour": round(items / hours, 1),
+        "energy": {
+            "battery_used": meter.battery_used,
+            "battery_charged": meter.battery_charged,
+            "battery_per_task": round(meter.battery_used / completed, 2) if completed else None
+        },
+        "queue": {
+            "mean": round(meter.queue_total / meter.samples, 2),
+            "max": meter.queue_max,
+            "final": len(model.scheduler)
+        },
+        "utilization": {status: round(count / robot_ticks, 3)
+                        for status, count in sorted(meter.status_ticks.items())},
+        "charging": model.charging.stats()
+    }
+
+
+def process_pool(workers=None):
+    """A pool whose every scenario gets a freshly spawned process."""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               max_tasks_per_child=1)
+
+
+def run_scenarios(scenarios, workers=None):
+    """Run independent scenarios in parallel; results in scenario order."""
+    with process_pool(workers) as pool:
+        return list(pool.map(run_scenario, scenarios))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run fleet scenarios headless on a simulated clock")
+    parser.add_argument("scenarios", nargs="+", help="scenario files")
+    parser.add_argument("--workers", type=int, default=None, help="parallel processes (default: CPU count)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    scenarios = []
+    for path in args.scenarios:
+        with open(path, encoding="utf-8") as f:
+            scenarios.extend(expand_scenarios(json.load(f)))
+    started = time.perf_counter()
+    results = run_scenarios(scenarios, args.workers)
+    elapsed = time.perf_counter() - started
+
+    print(f"{'scenario':40} {'tasks/h':>8} {'items/h':>8} {'battery/task':>12} {'queue':>7} {'speedup':>8}")
+    for result in results:
+        print(f"{result['name'][:40]:40} {result['tasks']['per_hour']:8.1f} {result['items_per_hour']:8.1f} "
+              f"{result['energy']['battery_per_task'] or 0:12.2f} {result['queue']['mean']:7.2f} "
+              f"{result['speedup']:7.0f}x")
+    print(f"{len(results)} scenarios in {elapsed:.1f}s")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# instrumentation.py - Request counters and latency histograms in the Prometheus text format
+import bisect
+import math
+import threading
+import time
+
+from flask import has_request_context, request
+
+from json_fragments import FastJSONProvider
+
+# Upper bounds of the histogram buckets, in seconds and bytes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# WSGI environ key holding the request's start time
+STARTED_KEY = "robofleet.request_started"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counts per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def drain(self):
+        """The counts since the last drain, starting again from zero. Another
+        process's copy of the counter takes them with ``merge``."""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for label_values, amount in values.items():
+                self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield self.name, format_labels(self.labels, label_values), value
+
+
+class Histogram:
+    """Observations per label set, counted into cumulative buckets with
+    their sum, as Prometheus histograms are."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}       # label values -> [per-bucket counts (+Inf last), sum]
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def drain(self):
+        """The observations since the last drain, starting again from none.
+        Another process's copy of the histogram takes them with ``merge``."""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for label_values, (counts, total) in values.items():
+                entry = self._values.get(label_values)
+                if entry is None:
+                    entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+                entry[0] = [mine + theirs for mine, theirs in zip(entry[0], counts)]
+                entry[1] += total
+
+    def samples(self):
+        with self._lock:
+            values = sorted((label_values, (list(counts), total))
+                            for label_values, (counts, total) in self._values.items())
+        for label_values, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield (f"{self.name}_bucket",
+                       format_labels(self.labels + ("le",), label_values + (format_value(float(bound)),)),
+                       cumulative)
+            labels = format_labels(self.labels, label_values)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Gauge:
+    """Values read when the metrics are scraped: ``read()`` returns a
+    number, or ``{label values: number}`` for a labelled gauge."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.read = read
+
+    def samples(self):
+        value = self.read()
+        if not self.labels:
+            yield self.name, "", value
+            return
+        for label_values, item in sorted(value.items()):
+            yield self.name, format_labels(self.labels, label_values), item
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, read, labels=()):
+        return self.register(Gauge(name, help_text, read, labels))
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetrics:
+    """Flask request middleware: counts every request by route, method and
+    status, and records its latency, response size and JSON encoding time.
+    Routes are labelled by their URL rule (``/api/ai/jobs/<int:job_id>``),
+    so the label sets stay few. Each request costs two clock reads and a
+    few dictionary updates.
+
+    A worker process records into its own ``RequestMetrics`` and sends
+    each ``drain`` to the owner's ``merge``, so one ``/metrics`` covers
+    requests served anywhere."""
+
+    def __init__(self, registry):
+        self.requests = registry.counter(
+            "robofleet_http_requests_total", "HTTP requests by route, method and status",
+            ("route", "method", "status"))
+        self.latency = registry.histogram(
+            "robofleet_http_request_duration_seconds", "Time from request to response, by route",
+            ("route", "method"))
+        self.size = registry.histogram(
+            "robofleet_http_response_size_bytes", "Response body size, by route",
+            ("route",), SIZE_BUCKETS)
+        self.json_encode = registry.histogram(
+            "robofleet_json_encode_seconds", "Time encoding JSON response bodies, by route",
+            ("route",))
+        self.metrics = (self.requests, self.latency, self.size, self.json_encode)
+        self.endpoints = None
+
+    def init_app(self, app, endpoints=None):
+        """Record requests to ``app``; only those to the named view
+        functions when ``endpoints`` is given."""
+        self.endpoints = None if endpoints is None else frozenset(endpoints)
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.json = TimedJSONProvider(app, self)
+
+    def drain(self):
+        """Everything recorded since the last drain, by metric name."""
+        return {metric.name: metric.drain() for metric in self.metrics}
+
+    def merge(self, report):
+        """Add a ``drain`` from another process's ``RequestMetrics``."""
+        for metric in self.metrics:
+            metric.merge(report.get(metric.name, {}))
+
+    @staticmethod
+    def route(req=None):
+        rule = (req or request).url_rule
+        return rule.rule if rule is not None else "<unmatched>"
+
+    def _before(self):
+        if self.endpoints is None or request.endpoint in self.endpoints:
+            request.environ[STARTED_KEY] = time.perf_counter()
+
+    def _after(self, response):
+        # Resolve the request proxy once; each access through it costs
+        req = request._get_current_object()
+        started = req.environ.get(STARTED_KEY)
+        if started is not None:
+            route = self.route(req)
+            self.latency.observe(time.perf_counter() - started, route, req.method)
+            self.requests.inc(route, req.method, str(response.status_code))
+            # Streamed responses have no length up front
+            if not response.is_streamed:
+                self.size.observe(response.calculate_content_length() or 0, route)
+        return response
+
+
+class TimedJSONProvider(FastJSONProvider):
+    """The app's JSON provider, timing every ``dumps`` made while handling
+    a request (``jsonify`` included)."""
+
+    def __init__(self, app, metrics):
+        super().__init__(app)
+        self.metrics = metrics
+
+    def dumps(self, obj, **kwargs):
+        if not has_request_context() or STARTED_KEY not in request.environ:
+            return super().dumps(obj, **kwargs)
+        started = time.perf_counter()
+        text = super().dumps(obj, **kwargs)
+        self.metrics.json_encode.observe(time.perf_counter() - started, self.metrics.route())
+        return text
@@ -0,0 +1,128 @@
+# intent_matcher.py - Compiled phrase matching for AI commands
+import re
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercase word tokens; punctuation and hyphens separate words, so
+    "Beta-Bot" and "beta bot" read the same."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class PhraseMatcher:
+    """Finds every occurrence of any of a set of phrases in a text.
+
+    Phrases are sequences of tokens, compiled into an Aho-Corasick
+    automaton over tokens: a trie of the phrases plus, for each node, a
+    failure link to the longest proper suffix that is also in the trie.
+    The text is read once, token by token, so matching costs the same
+    however many phrases there are. Phrases may overlap and share
+    prefixes; each carries a payload.
+    """
+
+    def __init__(self):
+        self._goto = [{}]       # state -> {token: next state}
+        self._fail = [0]
+        self._own = [[]]        # state -> [(phrase length, payload), ...] of the phrase ending there
+        self._out = [[]]        # the same plus those of its suffixes, once compiled
+        self._compiled = True
+
+    def add(self, phrase, payload):
+        tokens = tokenize(phrase)
+        if not tokens:
+            raise ValueError(f"Phrase '{phrase}' has no words")
+        state = 0
+        for token in tokens:
+            next_state = self._goto[state].get(token)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+                self._goto[state][token] = next_state
+            state = next_state
+        self._own[state].append((len(tokens), payload))
+        self._compiled = False
+
+    def compile(self):
+        """Build the failure links (breadth first, so a node's suffixes are
+        done before it) and merge each node's outputs with its suffix's."""
+        goto, fail = self._goto, self._fail
+        out = [list(phrases) for phrases in self._own]
+        queue = list(goto[0].values())
+        for state in queue:
+            fail[state] = 0
+        for state in queue:
+            for token, child in goto[state].items():
+                suffix = fail[state]
+                while suffix and token not in goto[suffix]:
+                    suffix = fail[suffix]
+                fail[child] = goto[suffix].get(token, 0)
+                out[child].extend(out[fail[child]])
+                queue.append(child)
+        self._out = out
+        self._compiled = True
+
+    def find(self, text):
+        """Every phrase occurrence in ``text`` as ``(start, end, payload)``
+        token positions, ordered by where they end."""
+        if not self._compiled:
+            self.compile()
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        state = 0
+        for position, token in enumerate(tokenize(text)):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for length, payload in out[state]:
+                matches.append((position + 1 - length, position + 1, payload))
+        return matches
+
+
+class CommandParser:
+    """Reads the intent and the robots and zones a command names.
+
+    ``intents`` maps each intent to the phrases that express it. When a
+    command expresses several, the one with the highest ``priorities``
+    entry (default 0) wins, then the one mentioned first. Entities are
+    added with ``add_robot`` / ``add_zone``.
+    """
+
+    def __init__(self, intents, priorities=None):
+        self.priorities = priorities or {}
+        self.matcher = PhraseMatcher()
+        self.intent_words = set()
+        for intent, phrases in intents.items():
+            for phrase in phrases:
+                self.matcher.add(phrase, ("intent", intent))
+                self.intent_words.update(tokenize(phrase))
+
+    def add_robot(self, phrase, robot_id):
+        self.matcher.add(phrase, ("robot", robot_id))
+
+    def add_zone(self, phrase, zone):
+        self.matcher.add(phrase, ("zone", zone))
+
+    def parse(self, command):
+        """``{"intent": name or None, "robots": [ids], "zones": [names]}``,
+        entities in the order they are mentioned, without repeats."""
+        intent = None
+        best = None
+        robots = {}
+        zones = {}
+        for start, _, (kind, value) in self.matcher.find(command):
+            if kind == "intent":
+                key = (-self.priorities.get(value, 0), start)
+                if best is None or key < best:
+                    intent, best = value, key
+            elif kind == "robot":
+                robots[value] = min(start, robots.get(value, start))
+            else:
+                zones[value] = min(start, zones.get(value, start))
+        return {
+            "intent": intent,
+            "robots": sorted(robots, key=robots.get),
+            "zones": sorted(zones, key=zones.get)
+        }
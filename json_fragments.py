@@ -0,0 +1,74 @@
+# json_fragments.py - JSON encoding with cached, pre-encoded fragments
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:     # optional; the standard library encoder is used without it
+    orjson = None
+
+
+def dumps(obj):
+    """Compact JSON text for ``obj``, from orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, separators=(",", ":"))
+
+
+class FragmentCache:
+    """Encoded JSON of values by key, re-encoded only when a key's value is
+    replaced by a different object. Meant for published values (the fleet
+    store's robot and task dicts), which are new objects whenever they
+    change and are never mutated afterwards. Safe to share between
+    threads: a race at worst encodes a value twice."""
+
+    def __init__(self, encode=dumps):
+        self.encode = encode
+        self._entries = {}      # key -> (value, its encoding)
+
+    def get(self, key, value):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] is not value:
+            entry = self._entries[key] = (value, self.encode(value))
+        return entry[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FleetEncoder:
+    """Fleet payloads spliced together from cached robot and task entry
+    encodings (see ``FragmentCache``)."""
+
+    def __init__(self, encode=dumps):
+        self.encode = encode
+        self.robots = FragmentCache(encode)
+        self.tasks = FragmentCache(encode)
+
+    def document(self, head, robots, task_execution, timestamp):
+        """JSON text of a fleet payload: the ``head`` fields, then ``robots``
+        (published robot dicts) and ``task_execution`` (robot id ->
+        published entry), then ``timestamp``."""
+        robot_json = ",".join(self.robots.get(robot['id'], robot) for robot in robots)
+        task_json = ",".join(f'"{robot_id}":{self.tasks.get(robot_id, entry)}'
+                             for robot_id, entry in task_execution.items())
+        return (f'{self.encode(head)[:-1]},"robots":[{robot_json}],"task_execution":{{{task_json}}},'
+                f'"timestamp":{self.encode(timestamp)}}}')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, encoding with orjson when it is installed.
+    Keys are sorted as Flask sorts them, and dates and types orjson doesn't
+    know go through Flask's usual conversions."""
+
+    def dumps(self, obj, **kwargs):
+        # jsonify asks for compact separators, which is all orjson writes
+        if kwargs.get("separators") == (",", ":"):
+            del kwargs["separators"]
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
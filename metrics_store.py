@@ -0,0 +1,222 @@
+# metrics_store.py - Fixed-memory time series with multi-resolution rollups
+import math
+import threading
+from array import array
+from collections import OrderedDict
+
+# (bucket seconds, buckets kept) per rollup: fleet-wide series keep 10
+# minutes at 1s, a day at 1m and 30 days at 1h; per-robot series, sampled
+# less often, keep 20 minutes at 10s, 2 hours at 1m and 2 days at 1h
+FLEET_RESOLUTIONS = ((1, 600), (60, 1440), (3600, 720))
+ROBOT_RESOLUTIONS = ((10, 120), (60, 120), (3600, 48))
+
+WINDOW_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_window(text):
+    """Seconds in a window like ``90``, ``90s``, ``5m``, ``1h`` or ``7d``."""
+    text = str(text).strip().lower()
+    unit = WINDOW_UNITS.get(text[-1:]) if text else None
+    number = text[:-1] if unit else text
+    try:
+        seconds = float(number) * (unit or 1)
+    except ValueError:
+        raise ValueError(f"Invalid window '{text}'") from None
+    if not math.isfinite(seconds) or seconds <= 0:
+        raise ValueError(f"Invalid window '{text}'")
+    return seconds
+
+
+class Rollup:
+    """A ring of ``capacity`` buckets of ``resolution_s`` seconds. Each
+    bucket keeps the count, sum, min, max and last value of the samples
+    that fell in it; a sample for a new bucket takes over the slot of the
+    oldest, so memory never grows."""
+
+    def __init__(self, resolution_s, capacity):
+        self.resolution_s = resolution_s
+        self.capacity = capacity
+        self.bucket = array('q', [-1]) * capacity   # bucket number each slot holds
+        self.count = array('q', [0]) * capacity
+        self.total = array('d', [0.0]) * capacity
+        self.low = array('d', [0.0]) * capacity
+        self.high = array('d', [0.0]) * capacity
+        self.last = array('d', [0.0]) * capacity
+
+    @property
+    def span_s(self):
+        return self.resolution_s * self.capacity
+
+    def add(self, t, value):
+        bucket = int(t // self.resolution_s)
+        slot = bucket % self.capacity
+        if self.bucket[slot] != bucket:
+            self.bucket[slot] = bucket
+            self.count[slot] = 1
+            self.total[slot] = self.low[slot] = self.high[slot] = self.last[slot] = value
+            return
+        self.count[slot] += 1
+        self.total[slot] += value
+        if value < self.low[slot]:
+            self.low[slot] = value
+        if value > self.high[slot]:
+            self.high[slot] = value
+        self.last[slot] = value
+
+    def buckets(self, start, end):
+        """``(start time, count, sum, min, max, last)`` of every bucket with
+        samples between ``start`` and ``end``, oldest first. Visits at most
+        ``capacity`` slots."""
+        last = int(end // self.resolution_s)
+        first = max(int(start // self.resolution_s), last - self.capacity + 1)
+        for bucket in range(first, last + 1):
+            slot = bucket % self.capacity
+            if self.bucket[slot] == bucket:
+                yield (bucket * self.resolution_s, self.count[slot], self.total[slot],
+                       self.low[slot], self.high[slot], self.last[slot])
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class TimeSeries:
+    """One metric, sampled into every rollup at once. A window is read from
+    the finest rollup that spans it, so a query costs at most one ring's
+    worth of buckets however long the series has been recording.
+
+    A ``counter`` series samples amounts (items handled in a tick) rather
+    than levels (average battery), and its summaries add the window's total
+    and rate.
+    """
+
+    def __init__(self, resolutions=FLEET_RESOLUTIONS, counter=False):
+        self.rollups = [Rollup(resolution_s, capacity) for resolution_s, capacity in resolutions]
+        self.counter = counter
+        self.first = None
+
+    def add(self, t, value):
+        if self.first is None:
+            self.first = t
+        for rollup in self.rollups:
+            rollup.add(t, value)
+
+    def rollup_for(self, window_s):
+        for rollup in self.rollups:
+            if rollup.span_s >= window_s:
+                return rollup
+        return self.rollups[-1]
+
+    def summary(self, window_s, now):
+        """Spread (and for counters, total and rate) of the samples in the
+        last ``window_s`` seconds, or None if there are none. Percentiles
+        are of the bucket means at the rollup's resolution."""
+        rollup = self.rollup_for(window_s)
+        buckets = list(rollup.buckets(now - window_s, now))
+        if not buckets:
+            return None
+        count = sum(bucket[1] for bucket in buckets)
+        total = sum(bucket[2] for bucket in buckets)
+        means = sorted(bucket[2] / bucket[1] for bucket in buckets)
+        summary = {
+            "samples": count,
+            "mean": round(total / count, 3),
+            "min": min(bucket[3] for bucket in buckets),
+            "max": max(bucket[4] for bucket in buckets),
+            "last": buckets[-1][5],
+            "p50": round(percentile(means, 0.5), 3),
+            "p95": round(percentile(means, 0.95), 3),
+            "resolution_s": rollup.resolution_s
+        }
+        if self.counter:
+            # A series younger than the window only covers part of it
+            covered_s = max(min(window_s, now - self.first), rollup.resolution_s)
+            summary["total"] = round(total, 3)
+            summary["rate_per_hour"] = round(total / covered_s * 3600, 3)
+        return summary
+
+    def points(self, window_s, now):
+        """``[bucket start, mean]`` per bucket in the window, for charts."""
+        rollup = self.rollup_for(window_s)
+        return [[start, round(total / count, 3)]
+                for start, count, total, _, _, _ in rollup.buckets(now - window_s, now)]
+
+
+class MetricsStore:
+    """Named fleet-wide series, plus a smaller set of series per robot,
+    created on first use. Series named in ``counters`` are counters.
+
+    At most ``robot_limit`` robots have series (None for no limit): robots
+    are taken on as they are first recorded until the limit is reached,
+    and after that only when asked for by ``robot_summary``, in place of
+    the robot asked for least recently. The store has its own lock, so it
+    can be written and read without holding any other."""
+
+    def __init__(self, resolutions=FLEET_RESOLUTIONS, robot_resolutions=ROBOT_RESOLUTIONS, counters=(),
+                 robot_limit=None):
+        self.resolutions = resolutions
+        self.robot_resolutions = robot_resolutions
+        self.counters = set(counters)
+        self.robot_limit = robot_limit
+        self.series = {}
+        self.robots = OrderedDict()     # robot id -> {name: TimeSeries}, least recently asked for first
+        self._lock = threading.Lock()
+
+    @property
+    def max_window_s(self):
+        return max(resolution_s * capacity for resolution_s, capacity in self.resolutions)
+
+    def tracked_robots(self):
+        """Ids of the robots with series, or None while there is room for
+        more."""
+        with self._lock:
+            if self.robot_limit is None or len(self.robots) < self.robot_limit:
+                return None
+            return list(self.robots)
+
+    def record(self, name, t, value):
+        with self._lock:
+            series = self.series.get(name)
+            if series is None:
+                series = self.series[name] = TimeSeries(self.resolutions, name in self.counters)
+            series.add(t, value)
+
+    def record_robot(self, robot_id, name, t, value):
+        """Add a sample to one of a robot's series; dropped if the robot
+        has none and the store is full."""
+        with self._lock:
+            robot = self.robots.get(robot_id)
+            if robot is None:
+                if self.robot_limit is not None and len(self.robots) >= self.robot_limit:
+                    return
+                robot = self.robots[robot_id] = {}
+            series = robot.get(name)
+            if series is None:
+                series = robot[name] = TimeSeries(self.robot_resolutions, name in self.counters)
+            series.add(t, value)
+
+    def summary(self, name, window_s, now):
+        with self._lock:
+            series = self.series.get(name)
+            return series.summary(window_s, now) if series is not None else None
+
+    def points(self, name, window_s, now):
+        with self._lock:
+            series = self.series.get(name)
+            return series.points(window_s, now) if series is not None else []
+
+    def robot_summary(self, robot_id, window_s, now):
+        """``{name: {"summary", "points"}}`` for one robot's series, or None
+        if it has none yet; a robot without series is taken on from now."""
+        with self._lock:
+            robot = self.robots.get(robot_id)
+            if robot is None:
+                if self.robot_limit is not None:
+                    while self.robots and len(self.robots) >= self.robot_limit:
+                        self.robots.popitem(last=False)
+                    if self.robot_limit > 0:
+                        self.robots[robot_id] = {}
+                return None
+            self.robots.move_to_end(robot_id)
+            return {name: {"summary": series.summary(window_s, now), "points": series.points(window_s, now)}
+                    for name, series in sorted(robot.items())} or None
@@ -0,0 +1,326 @@
+# path_planner.py - Grid path planning for robot routes
+import heapq
+from array import array
+from collections import OrderedDict
+
+# Robots can't drive through these cells; routes to them end on the nearest
+# free cell at the edge of the block (e.g. the shelf face)
+BLOCKED_CELL_TYPES = ("shelf", "storage")
+# Landmarks an A* heuristic consults per route: those that bound its start
+# best, which is all but a little of what every landmark would give
+ACTIVE_LANDMARKS = 4
+
+
+class PathPlanner:
+    """Shortest 4-connected routes on the warehouse grid.
+
+    Routes to the layout's named locations and zones (charging, packing)
+    use a cached BFS distance field per target: once a field exists, the
+    distance from any cell is a lookup and the route is a walk down the
+    gradient, so planning cost is proportional to route length rather than
+    grid size. Fields are built lazily and kept in a small LRU cache.
+    Routes between arbitrary cells use A*, with the zone fields as landmarks
+    to tighten the Manhattan heuristic.
+    """
+
+    def __init__(self, warehouse, blocked_types=BLOCKED_CELL_TYPES, max_fields=32, extra_landmarks=8):
+        self.rows = warehouse.rows
+        self.cols = warehouse.cols
+        self.max_fields = max_fields
+        self.extra_landmarks = extra_landmarks
+        self.passable = bytearray(
+            0 if warehouse.cell_type((row, col)) in blocked_types else 1
+            for row in range(self.rows) for col in range(self.cols)
+        )
+        self._fields = OrderedDict()
+        self._access = {}
+        # Distance fields kept as A* landmarks (see warm_cache)
+        self._landmarks = []
+        self.named_targets = {name: [cell] for name, cell in warehouse.locations.items()}
+        for cell_type in ("charging", "packing"):
+            cells = warehouse.cells_of_type(cell_type)
+            if cells:
+                self.named_targets.setdefault(cell_type, cells)
+
+    # ---------- Helpers ----------
+    def index_of(self, cell):
+        return cell[0] * self.cols + cell[1]
+
+    def cell_of(self, index):
+        return divmod(index, self.cols)
+
+    def neighbors(self, index):
+        row, col = divmod(index, self.cols)
+        if col > 0:
+            yield index - 1
+        if col < self.cols - 1:
+            yield index + 1
+        if row > 0:
+            yield index - self.cols
+        if row < self.rows - 1:
+            yield index + self.cols
+
+    def in_bounds(self, cell):
+        return 0 <= cell[0] < self.rows and 0 <= cell[1] < self.cols
+
+    def is_passable(self, cell):
+        return self.in_bounds(cell) and bool(self.passable[self.index_of(cell)])
+
+    def access_cells(self, cell):
+        """Cells a robot stops on to work at ``cell``: the cell itself if it
+        is passable, otherwise the free cells bordering its shelf/storage
+        block that are closest to it."""
+        return [self.cell_of(index) for index in self.access_indexes(self.index_of(cell))]
+
+    def access_indexes(self, index):
+        """``access_cells`` for a cell index, as indexes."""
+        if self.passable[index]:
+            return [index]
+        cached = self._access.get(index)
+        if cached is not None:
+            return cached
+
+        # Flood the blocked block containing the cell and collect its border
+        seen = {index}
+        stack = [index]
+        border = set()
+        while stack:
+            current = stack.pop()
+            for neighbor in self.neighbors(current):
+                if self.passable[neighbor]:
+                    border.add(neighbor)
+                elif neighbor not in seen:
+                    seen.add(neighbor)
+                    stack.append(neighbor)
+
+        row, col = self.cell_of(index)
+        def manhattan(i):
+            r, c = self.cell_of(i)
+            return abs(r - row) + abs(c - col)
+        closest = min(map(manhattan, border), default=None)
+        cached = sorted(i for i in border if manhattan(i) == closest)
+        self._access[index] = cached
+        return cached
+
+    # ---------- Distance fields ----------
+    def distance_field(self, targets):
+        """BFS distances from every cell to the nearest of ``targets``
+        (a named target or a list of cells); -1 where unreachable."""
+        key = self._field_key(targets)
+        field = self._fields.get(key)
+        if field is not None:
+            self._fields.move_to_end(key)
+            return field
+
+        cells = self.named_targets[targets] if isinstance(targets, str) else targets
+        sources = {source for cell in cells for source in self.access_indexes(self.index_of(cell))}
+        field = self._bfs(sorted(sources))
+        self._fields[key] = field
+        if len(self._fields) > self.max_fields:
+            self._fields.popitem(last=False)
+        return field
+
+    def has_distance_field(self, targets):
+        """Whether the field for ``targets`` is cached (so costs no search)."""
+        return self._field_key(targets) in self._fields
+
+    @staticmethod
+    def _field_key(targets):
+        return targets if isinstance(targets, str) else tuple(sorted(map(tuple, targets)))
+
+    def warm_cache(self):
+        """Precompute the fields for every named location and zone. They
+        double as A* landmarks: for any cells a, b and landmark L,
+        ``|d(L, a) - d(L, b)|`` is a lower bound on ``d(a, b)``. Up to
+        ``extra_landmarks`` more are added at the cells furthest from the
+        landmarks so far (the floor's far corners and the back of long
+        blocks), where the named ones leave routes between arbitrary cells
+        with a loose bound."""
+        self._landmarks = [self.distance_field(name) for name in self.named_targets]
+        nearest = None
+        for field in self._landmarks:
+            nearest = field if nearest is None else array("i", map(min, nearest, field))
+        for _ in range(self.extra_landmarks if nearest is not None else 0):
+            furthest = max(range(len(nearest)), key=nearest.__getitem__)
+            if nearest[furthest] <= 0:
+                break
+            field = self._bfs([furthest])
+            self._landmarks.append(field)
+            nearest = array("i", map(min, nearest, field))
+
+    def _bfs(self, sources):
+        field = array("i", [-1]) * (self.rows * self.cols)
+        passable = self.passable
+        cols = self.cols
+        last_row_start = (self.rows - 1) * cols
+        for source in sources:
+            field[source] = 0
+
+        frontier = list(sources)
+        distance = 0
+        while frontier:
+            distance += 1
+            next_frontier = []
+            append = next_frontier.append
+            for index in frontier:
+                col = index % cols
+                if col > 0:
+                    neighbor = index - 1
+                    if passable[neighbor] and field[neighbor] < 0:
+                        field[neighbor] = distance
+                        append(neighbor)
+                if col < cols - 1:
+                    neighbor = index + 1
+                    if passable[neighbor] and field[neighbor] < 0:
+                        field[neighbor] = distance
+                        append(neighbor)
+                if index >= cols:
+                    neighbor = index - cols
+                    if passable[neighbor] and field[neighbor] < 0:
+                        field[neighbor] = distance
+                        append(neighbor)
+                if index < last_row_start:
+                    neighbor = index + cols
+                    if passable[neighbor] and field[neighbor] < 0:
+                        field[neighbor] = distance
+                        append(neighbor)
+            frontier = next_frontier
+        return field
+
+    def _descend(self, field, start):
+        # A robot parked on a shelf or storage cell first steps out to the
+        # edge of its block
+        path = [start]
+        current = start
+        if field[current] < 0:
+            options = [i for i in self.access_indexes(current) if field[i] >= 0]
+            if not options:
+                return None
+            current = min(options, key=field.__getitem__)
+            path.extend(self._walk(start, current))
+        while field[current] > 0:
+            target = field[current] - 1
+            for neighbor in self.neighbors(current):
+                if field[neighbor] == target:
+                    current = neighbor
+                    break
+            path.append(current)
+        return path
+
+    # ---------- Planning ----------
+    def distance_to(self, start, target):
+        """Route length in cells from ``start`` to a named target, or None."""
+        field = self.distance_field(target)
+        index = self.index_of(start)
+        if field[index] >= 0:
+            return field[index]
+        path = self._descend(field, index)
+        return len(path) - 1 if path is not None else None
+
+    def plan_to(self, start, target):
+        """Route (list of ``(row, col)``) from ``start`` to the nearest access
+        cell of a named target, or None if unreachable."""
+        path = self._descend(self.distance_field(target), self.index_of(start))
+        return [self.cell_of(index) for index in path] if path is not None else None
+
+    def plan(self, start, goal):
+        """Route between two cells with A*, or None if unreachable. Blocked
+        ends are replaced by the nearest access cell of their block."""
+        prefix = []
+        start_index = self.index_of(start)
+        if not self.passable[start_index]:
+            exits = self.access_indexes(start_index)
+            if not exits:
+                return None
+            exit_index = min(exits, key=lambda i: self._manhattan(i, goal))
+            prefix = [start] + [self.cell_of(i) for i in self._walk(start_index, exit_index)[:-1]]
+            start_index = exit_index
+        goals = self.access_indexes(self.index_of(goal))
+        if not goals:
+            return None
+        goal_index = min(goals, key=lambda i: self._manhattan(i, self.cell_of(start_index)))
+
+        path = self._astar(start_index, goal_index)
+        if path is None:
+            return None
+        return prefix + [self.cell_of(index) for index in path]
+
+    def _walk(self, start, end):
+        """Straight L-shaped steps from ``start`` to ``end`` (excluding
+        ``start``), used to leave a blocked block."""
+        steps = []
+        row, col = divmod(start, self.cols)
+        end_row, end_col = divmod(end, self.cols)
+        while row != end_row:
+            row += 1 if end_row > row else -1
+            steps.append(row * self.cols + col)
+        while col != end_col:
+            col += 1 if end_col > col else -1
+            steps.append(row * self.cols + col)
+        return steps
+
+    def _manhattan(self, index, cell):
+        row, col = divmod(index, self.cols)
+        return abs(row - cell[0]) + abs(col - cell[1])
+
+    def heuristic(self, goal_index, start_index=None):
+        """Admissible estimate of the route length to ``goal_index``, as a
+        function of a cell index. Given the route's ``start_index``, only
+        the ``ACTIVE_LANDMARKS`` landmarks with the best bound there are
+        consulted."""
+        goal_row, goal_col = divmod(goal_index, self.cols)
+        cols = self.cols
+        landmarks = [(field, field[goal_index]) for field in self._landmarks if field[goal_index] >= 0]
+        if start_index is not None and len(landmarks) > ACTIVE_LANDMARKS:
+            landmarks = sorted(landmarks, key=lambda landmark: -abs(landmark[1] - landmark[0][start_index]))
+            landmarks = landmarks[:ACTIVE_LANDMARKS]
+
+        def estimate(index):
+            row, col = divmod(index, cols)
+            best = abs(row - goal_row) + abs(col - goal_col)
+            for field, to_goal in landmarks:
+                bound = abs(to_goal - field[index])
+                if bound > best:
+                    best = bound
+            return best
+        return estimate
+
+    def _astar(self, start_index, goal_index):
+        if start_index == goal_index:
+            return [start_index]
+
+        passable = self.passable
+        heuristic = self.heuristic(goal_index, start_index)
+        g_score = {start_index: 0}
+        came_from = {}
+        # Ties on f go to the deeper node, which cuts expansions on open floor
+        open_heap = [(heuristic(start_index), 0, start_index)]
+        while open_heap:
+            _, negative_g, index = heapq.heappop(open_heap)
+            g = -negative_g
+            if index == goal_index:
+                path = [index]
+                while index in came_from:
+                    index = came_from[index]
+                    path.append(index)
+                path.reverse()
+                return path
+            if g > g_score[index]:
+                continue
+            for neighbor in self.neighbors(index):
+                if not passable[neighbor]:
+                    continue
+                tentative = g + 1
+                if tentative < g_score.get(neighbor, tentative + 1):
+                    g_score[neighbor] = tentative
+                    came_from[neighbor] = index
+                    heapq.heappush(open_heap, (tentative + heuristic(neighbor), -tentative, neighbor))
+        return None
+
+
+def parse_speed(speed):
+    """Robot speed in m/s from strings like '2.5 m/s'."""
+    try:
+        return float(str(speed).split()[0])
+    except (ValueError, IndexError):
+        return 1.0
@@ -0,0 +1,31 @@
+# rng_streams.py - Independent, seedable random streams for the simulation
+import random
+
+
+class RandomStreams:
+    """Named ``random.Random`` streams, all derived from one seed.
+
+    Each subsystem (the map's initial stock, simulation counters, AI
+    responses, ...) and each robot draws from a stream of its own, seeded
+    from ``seed`` and the stream's name. A run started with the same seed
+    therefore replays exactly, and a change in one stream's consumers (a
+    robot that starts working earlier, an extra AI command) leaves every
+    other stream's draws where they were.
+    """
+
+    def __init__(self, seed=None):
+        # Without a seed, pick one so the run can still be replayed
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2 ** 32)
+        self._streams = {}
+
+    def stream(self, name):
+        rng = self._streams.get(name)
+        if rng is None:
+            # String seeds are hashed (SHA-512), so this is stable across
+            # runs and platforms
+            rng = self._streams[name] = random.Random(f"{self.seed}/{name}")
+        return rng
+
+    def robot(self, robot_id):
+        """The stream for one robot's battery and task progress."""
+        return self.stream(f"robot/{robot_id}")
@@ -0,0 +1,692 @@
+# route_coordinator.py - Conflict-free multi-robot routing over a space-time reservation table
+import heapq
+import math
+from collections import defaultdict, deque
+
+from path_planner import parse_speed
+
+# Search expansions between checks of the coordinator's interrupt
+INTERRUPT_CHECK_EVERY = 1024
+# A fallback route search may expand up to this fraction (1/n) of the floor
+# before the target's distance field is built instead, which costs a pass
+# over the whole floor
+STATIC_PATH_SHARE = 8
+
+
+class ReservationTable:
+    """Which robot holds which cell at which time step.
+
+    A moving robot reserves ``(cell, step)`` slots along its planned route.
+    A robot standing still (idle, or at the end of its route) is parked on
+    its cell from some step on, with no end. Cells are flat grid indexes.
+    """
+
+    def __init__(self):
+        self._cells = {}                        # cell -> {step: robot id}
+        self._held = defaultdict(deque)         # robot id -> its slot keys, roughly in step order
+        self._parked = defaultdict(dict)        # cell -> {robot id: parked since step}
+        self._parked_at = {}                    # robot id -> cell
+        self._slot_count = 0
+
+    def __len__(self):
+        return self._slot_count
+
+    def holder(self, cell, step):
+        return self._cells.get(cell, {}).get(step)
+
+    def is_parked_by_other(self, cell, robot_id):
+        return any(other != robot_id for other in self._parked.get(cell, ()))
+
+    def users_from(self, cell, step, exclude=None):
+        """Robots with a slot on ``cell`` at ``step`` or later."""
+        return {other for slot, other in self._cells.get(cell, {}).items()
+                if slot >= step and other != exclude}
+
+    def safe_intervals(self, cell, robot_id, start, ignore_parked=False):
+        """Maximal ``(first, last)`` step runs from ``start`` on in which no
+        other robot holds ``cell``; ``last`` is None for a run with no end.
+        With ``ignore_parked``, robots already parked there by ``start``
+        don't count (robots parking there later still do)."""
+        slots = self._cells.get(cell)
+        if slots is None and cell not in self._parked:
+            return [(start, None)]
+        taken = sorted(slot for slot, other in (slots or {}).items()
+                       if other != robot_id and slot >= start)
+        parked_since = min((since for other, since in self._parked.get(cell, {}).items()
+                            if other != robot_id and not (ignore_parked and since <= start)), default=None)
+
+        intervals = []
+        first = start
+        for slot in taken:
+            if parked_since is not None and slot >= parked_since:
+                break
+            if slot > first:
+                intervals.append((first, slot - 1))
+            first = max(first, slot + 1)
+        if parked_since is None:
+            intervals.append((first, None))
+        elif parked_since > first:
+            intervals.append((first, parked_since - 1))
+        return intervals
+
+    def reserve(self, robot_id, cell, step):
+        slots = self._cells.setdefault(cell, {})
+        holder = slots.get(step)
+        if holder == robot_id:
+            return
+        if holder is not None:
+            raise ValueError(f"Cell {cell} at step {step} is already held by robot {holder}")
+        slots[step] = robot_id
+        self._held[robot_id].append((cell, step))
+        self._slot_count += 1
+
+    def _drop(self, robot_id, cell, step):
+        slots = self._cells.get(cell)
+        if slots is not None and slots.get(step) == robot_id:
+            del slots[step]
+            self._slot_count -= 1
+            if not slots:
+                del self._cells[cell]
+
+    def release(self, robot_id, from_step=None):
+        """Drop the robot's slots at ``from_step`` and later (all of them
+        when None)."""
+        held = self._held.pop(robot_id, ())
+        kept = deque()
+        for cell, step in held:
+            if from_step is not None and step < from_step:
+                kept.append((cell, step))
+            else:
+                self._drop(robot_id, cell, step)
+        if kept:
+            self._held[robot_id] = kept
+
+    def expire(self, now):
+        """Forget slots from before step ``now``."""
+        for robot_id in list(self._held):
+            held = self._held[robot_id]
+            while held and held[0][1] < now:
+                self._drop(robot_id, *held.popleft())
+            if not held:
+                del self._held[robot_id]
+
+    def park(self, robot_id, cell, since):
+        self.unpark(robot_id)
+        self._parked[cell][robot_id] = since
+        self._parked_at[robot_id] = cell
+
+    def unpark(self, robot_id):
+        cell = self._parked_at.pop(robot_id, None)
+        if cell is not None:
+            parked = self._parked[cell]
+            del parked[robot_id]
+            if not parked:
+                del self._parked[cell]
+
+    def parked_cell(self, robot_id):
+        return self._parked_at.get(robot_id)
+
+    def parked(self):
+        """``(robot id, cell, since)`` for every parked robot."""
+        return [(robot_id, cell, since) for cell, robots in self._parked.items()
+                for robot_id, since in robots.items()]
+
+
+class RouteCoordinator:
+    """Plans routes for many robots so no two ever hold the same cell at
+    the same time.
+
+    Robots are planned one after another (cooperative A*): each search runs
+    over ``(cell, step)`` states and treats the slots reserved by routes
+    already planned as obstacles, waiting in place where it has to. A
+    search that runs out of its ``max_expansions`` budget falls back to the
+    shortest route around parked robots, ignoring moving ones, driven with
+    waits wherever another robot holds the next cell. Time
+    moves in steps of ``step_s`` seconds. A robot needs
+    ``ceil(cell_size_m / (speed * step_s))`` steps per cell and holds both
+    cells for the whole move, so robots can neither swap places nor
+    tailgate. Robots without a route are parked on their cell.
+
+    When a robot is delayed or halted, only the robots whose reservations
+    it now blocks are replanned.
+    """
+
+    def __init__(self, planner, step_s=0.25, cell_size_m=1.0, max_expansions=2000, max_wait_steps=120,
+                 heuristic_weight=1.2, interrupt=None):
+        self.planner = planner
+        # An Event; while it is set, searches give up (as if no route existed)
+        self.interrupt = interrupt
+        self.step_s = step_s
+        self.cell_size_m = cell_size_m
+        self.max_expansions = max_expansions
+        self.max_wait_steps = max_wait_steps
+        self.heuristic_weight = heuristic_weight
+        self.table = ReservationTable()
+        self.now = 0
+        self._clock = 0.0
+        # Search expansions so far, for callers budgeting planning time
+        self.expansions = 0
+        # robot id -> {"target", "speed", "states": [(cell, step), ...],
+        #              "cursor", "steps_per_cell"}
+        self.routes = {}
+
+    def steps_per_cell(self, speed):
+        return max(1, math.ceil(self.cell_size_m / (parse_speed(speed) * self.step_s)))
+
+    def is_moving(self, robot_id):
+        return robot_id in self.routes
+
+    def position(self, robot_id):
+        """The cell a robot is on now, or None if it isn't placed."""
+        route = self.routes.get(robot_id)
+        if route is not None:
+            return self.planner.cell_of(route["states"][route["cursor"]][0])
+        cell = self.table.parked_cell(robot_id)
+        return self.planner.cell_of(cell) if cell is not None else None
+
+    def place(self, robot_id, cell):
+        """Park a robot that isn't on a route at ``cell``."""
+        self.cancel(robot_id)
+        self.table.park(robot_id, self.planner.index_of(cell), self.now)
+
+    def cancel(self, robot_id):
+        """Drop a robot's route and reservations without parking it."""
+        self.routes.pop(robot_id, None)
+        self.table.release(robot_id)
+        self.table.unpark(robot_id)
+
+    # ---------- Planning ----------
+    def plan(self, robot_id, target, speed, start=None, max_expansions=None):
+        """Plan and reserve a route to ``target`` (a planner named target or
+        a ``(row, col)`` cell). A robot already on a route is replanned from
+        where it is; otherwise ``start`` (default: where it is parked) gives
+        its cell. Returns the route summary, or None (the robot stays
+        parked) when no route is found.
+
+        With ``max_expansions``, the search gets at most that budget, and a
+        robot no route is found for is left as it was (still on its old
+        route, if it had one).
+        """
+        anchor = self._anchor(robot_id)
+        if anchor is None:
+            cell = self.planner.index_of(start) if start is not None else self.table.parked_cell(robot_id)
+            if cell is None:
+                raise ValueError(f"Robot {robot_id} has no start cell")
+            anchor = (cell, self.now)
+        if max_expansions is not None:
+            # The search already ignores the robot's own reservations, so
+            # they are only let go of once a route is found
+            k = self.steps_per_cell(speed)
+            states = self._search(robot_id, anchor, target, k, max_expansions)
+            if states is None:
+                return None
+            self.routes.pop(robot_id, None)
+            self.table.release(robot_id, anchor[1] + 1)
+            self.table.unpark(robot_id)
+            self._commit(robot_id, target, speed, states, k)
+            return self._summarize(states, k)
+        self.routes.pop(robot_id, None)
+        self.table.release(robot_id, anchor[1] + 1)
+        return self._plan_or_park(robot_id, anchor, target, speed)
+
+    def _plan_from(self, robot_id, anchor, target, speed, max_expansions=None):
+        """Search and reserve a route from ``anchor``, within
+        ``max_expansions`` if given. A robot with no route parks on the
+        anchor cell; returns None in that case."""
+        self.table.unpark(robot_id)
+        k = self.steps_per_cell(speed)
+        states = self._search(robot_id, anchor, target, k, max_expansions)
+        if states is None:
+            self.table.park(robot_id, anchor[0], anchor[1])
+            return None
+        self._commit(robot_id, target, speed, states, k)
+        return self._summarize(states, k)
+
+    def _plan_or_park(self, robot_id, anchor, target, speed, max_expansions=None):
+        """``_plan_from``, replanning the routes a robot that ends up
+        parked is now in the way of. ``max_expansions`` caps all of it."""
+        spent_before = self.expansions
+        summary = self._plan_from(robot_id, anchor, target, speed, max_expansions)
+        if summary is None:
+            left = None if max_expansions is None else max(0, max_expansions - (self.expansions - spent_before))
+            self._replan(self.table.users_from(anchor[0], anchor[1], exclude=robot_id), left)
+        return summary
+
+    def summary(self, robot_id):
+        """Summary of what is left of a robot's route, or None."""
+        route = self.routes.get(robot_id)
+        if route is None:
+            return None
+        return self._summarize(route["states"][route["cursor"]:], route["steps_per_cell"])
+
+    def _summarize(self, states, k):
+        cells = [states[0][0]]
+        waited = 0
+        for (cell, step), (next_cell, next_step) in zip(states, states[1:]):
+            if next_cell != cell:
+                cells.append(next_cell)
+            else:
+                waited += next_step - step
+        path = [list(self.planner.cell_of(cell)) for cell in cells]
+        return {
+            "from": path[0],
+            "to": path[-1],
+            "distance_cells": len(path) - 1,
+            "travel_time_s": round((states[-1][1] - max(self.now, states[0][1])) * self.step_s, 2),
+            "wait_s": round(waited * self.step_s, 2),
+            "path": path
+        }
+
+    def _anchor(self, robot_id):
+        """Where a routed robot can be replanned from: its next state at or
+        after now, so a move already under way is finished first."""
+        route = self.routes.get(robot_id)
+        return self._anchor_of(route) if route is not None else None
+
+    def _anchor_of(self, route):
+        for state in route["states"][route["cursor"]:]:
+            if state[1] >= self.now:
+                return state
+        return route["states"][-1]
+
+    def _target_access(self, target):
+        planner = self.planner
+        cells = planner.named_targets[target] if isinstance(target, str) else [target]
+        return sorted({index for cell in cells for index in planner.access_indexes(planner.index_of(cell))})
+
+    def _goal_cells(self, robot_id, target):
+        """The cells a route to ``target`` may end on, plus how many cells
+        they can lie beyond the target's own access cells."""
+        planner = self.planner
+        goals = self._target_access(target)
+        free = [cell for cell in goals if not self.table.is_parked_by_other(cell, robot_id)]
+        if free or not goals:
+            return free, 0
+
+        # Every access cell is taken by a parked robot: queue on the nearest
+        # free cells around them instead, preferring cells no other route
+        # still crosses (so the robot can settle as soon as it gets there)
+        seen = set(goals)
+        frontier = goals
+        depth = 0
+        fallback = ([], 0)
+        while frontier and len(seen) < 4096:
+            depth += 1
+            ring = []
+            for cell in frontier:
+                for neighbor in planner.neighbors(cell):
+                    if neighbor not in seen and planner.passable[neighbor]:
+                        seen.add(neighbor)
+                        ring.append(neighbor)
+            free = [cell for cell in ring if not self.table.is_parked_by_other(cell, robot_id)]
+            clear = [cell for cell in free if not self.table.users_from(cell, self.now, exclude=robot_id)]
+            if clear:
+                return sorted(clear), depth
+            if free and not fallback[0]:
+                fallback = (sorted(free), depth)
+            if fallback[0] and depth >= fallback[1] + 4:
+                break
+            frontier = ring
+        return fallback
+
+    def _heuristic(self, target, slack, start):
+        """Lower bound on cells to the nearest goal, ignoring other robots:
+        the distance to the target's access cells (the cached field of a
+        named target, else the planner's landmark estimate for routes from
+        ``start``) less the ``slack`` by which goals can lie beyond them."""
+        planner = self.planner
+        if isinstance(target, str):
+            field = planner.distance_field(target)
+            return lambda cell: max(field[cell] - slack, 0)
+        estimates = [planner.heuristic(access, start) for access in self._target_access(target)]
+        if len(estimates) == 1:
+            estimate = estimates[0]
+            return lambda cell: max(estimate(cell) - slack, 0)
+        return lambda cell: max(min(estimate(cell) for estimate in estimates) - slack, 0)
+
+    def _search(self, robot_id, anchor, target, k, max_expansions=None):
+        """Safe-interval path planning (SIPP) from ``anchor`` (``(cell,
+        step)``) to the nearest goal cell the robot can then stay on.
+        Returns the ``(cell, step)`` states of the route, waits included,
+        or None. ``max_expansions`` lowers the coordinator's budget.
+
+        A search that runs out of budget is done again in a corridor one
+        cell either side of the shortest route around parked robots, which
+        it can't run out of: the robot keeps to that route, stepping aside
+        or waiting for robots in its way. With ``max_expansions`` finding
+        that route (a distance field built counts one expansion a cell)
+        counts against it too, and a search that runs out returns None.
+        """
+        goals, slack = self._goal_cells(robot_id, target)
+        if not goals:
+            return None
+        goal_set = set(goals)
+        heuristic = self._heuristic(target, slack, anchor[0])
+        budget = self.max_expansions if max_expansions is None else min(self.max_expansions, max_expansions)
+        horizon = anchor[1] + k * (3 * heuristic(anchor[0]) + 64) + self.max_wait_steps
+        spent_before = self.expansions
+        states, exhausted = self._sipp(robot_id, anchor, goal_set, heuristic, k, horizon, budget)
+        if not exhausted:
+            return states
+
+        planner = self.planner
+        static_budget = len(planner.passable) // STATIC_PATH_SHARE
+        if max_expansions is not None:
+            static_budget = min(static_budget, max_expansions - (self.expansions - spent_before))
+        path, exhausted = self._static_path(robot_id, anchor[0], goal_set, heuristic, static_budget)
+        if exhausted:
+            # Routes the heuristic guides badly (around the far end of a
+            # long block) walk the target's distance field instead; building
+            # one visits every cell
+            targets = target if isinstance(target, str) else [target]
+            if max_expansions is not None and not planner.has_distance_field(targets):
+                if len(planner.passable) > max_expansions - (self.expansions - spent_before):
+                    return None
+                self.expansions += len(planner.passable)
+            cells = planner.plan_to(planner.cell_of(anchor[0]), targets)
+            path = [planner.index_of(cell) for cell in cells] if cells is not None else None
+        if path is None:
+            return None
+        corridor = self._corridor(path)
+        states, _ = self._sipp(robot_id, anchor, goal_set, corridor.__getitem__, k, math.inf, math.inf,
+                               allowed=corridor)
+        return states
+
+    def _sipp(self, robot_id, anchor, goal_set, heuristic, k, horizon, budget, allowed=None):
+        """The search itself, over cells in ``allowed`` (default: all).
+        Returns ``(states or None, whether it ran out of budget)``.
+
+        A search state is a cell plus one of its safe intervals (a run of
+        steps no other robot holds it), reached at the earliest possible
+        step; waiting is folded into each move. On an empty floor this is
+        plain A* over cells.
+        """
+        start, start_step = anchor
+        passable = self.planner.passable
+        neighbors = self.planner.neighbors
+
+        interval_cache = {}
+
+        def intervals(cell):
+            found = interval_cache.get(cell)
+            if found is None:
+                # The robot may share its starting cell with other parked robots
+                found = interval_cache[cell] = self.table.safe_intervals(
+                    cell, robot_id, start_step, ignore_parked=cell == start)
+            return found
+
+        start_interval = next((i for i, (first, last) in enumerate(intervals(start))
+                               if first <= start_step and (last is None or start_step <= last)), None)
+        if start_interval is None:
+            return None, False
+
+        best = {(start, start_interval): start_step}
+        came_from = {}      # (cell, arrival) -> (previous cell, its arrival, departure)
+        # Ties on f go to the later state, i.e. the one further along
+        weight = self.heuristic_weight * k
+        open_heap = [(heuristic(start) * weight, -start_step, start, start_interval)]
+        expansions = 0
+        try:
+            while open_heap:
+                if expansions >= budget:
+                    return None, True
+                _, negative_step, cell, interval = heapq.heappop(open_heap)
+                step = -negative_step
+                if best.get((cell, interval)) != step:
+                    continue
+                expansions += 1
+                if (not expansions % INTERRUPT_CHECK_EVERY and self.interrupt is not None
+                        and self.interrupt.is_set()):
+                    return None, False
+                last = intervals(cell)[interval][1]
+
+                if cell in goal_set and last is None:
+                    return self._unwind(came_from, cell, step), False
+
+                # Robots may drive out of a shelf block but never into one
+                for neighbor in neighbors(cell):
+                    if (not passable[neighbor] and passable[cell]) or (allowed is not None and neighbor not in allowed):
+                        continue
+                    for index, (first, neighbor_last) in enumerate(intervals(neighbor)):
+                        # Both cells are held for the whole move
+                        depart = max(step, first)
+                        arrival = depart + k
+                        if (last is not None and arrival > last) or depart > horizon:
+                            break
+                        if neighbor_last is not None and arrival > neighbor_last:
+                            continue
+                        key = (neighbor, index)
+                        if arrival < best.get(key, arrival + 1):
+                            best[key] = arrival
+                            came_from[(neighbor, arrival)] = (cell, step, depart)
+                            heapq.heappush(open_heap, (arrival - start_step + heuristic(neighbor) * weight,
+                                                       -arrival, neighbor, index))
+            return None, False
+        finally:
+            self.expansions += expansions
+
+    def _static_path(self, robot_id, start, goal_set, heuristic, budget):
+        """Shortest route in cells from ``start`` to a goal, around robots
+        parked for good but ignoring the routes of moving ones (weighted
+        A* over cells, with the search's heuristic). Returns ``(path or
+        None, whether it ran out of budget)``."""
+        passable = self.planner.passable
+        neighbors = self.planner.neighbors
+        parked = self.table.is_parked_by_other
+        weight = self.heuristic_weight
+        g_score = {start: 0}
+        came_from = {}
+        open_heap = [(heuristic(start) * weight, 0, start)]
+        expansions = 0
+        try:
+            while open_heap:
+                _, negative_g, cell = heapq.heappop(open_heap)
+                g = -negative_g
+                if cell in goal_set:
+                    path = [cell]
+                    while cell in came_from:
+                        cell = came_from[cell]
+                        path.append(cell)
+                    path.reverse()
+                    return path, False
+                if g > g_score[cell]:
+                    continue
+                if expansions >= budget:
+                    return None, True
+                expansions += 1
+                for neighbor in neighbors(cell):
+                    if not passable[neighbor] and passable[cell]:
+                        continue
+                    tentative = g + 1
+                    if tentative < g_score.get(neighbor, tentative + 1) and not parked(neighbor, robot_id):
+                        g_score[neighbor] = tentative
+                        came_from[neighbor] = cell
+                        heapq.heappush(open_heap, (tentative + heuristic(neighbor) * weight, -tentative, neighbor))
+            return None, False
+        finally:
+            self.expansions += expansions
+
+    def _corridor(self, path):
+        """The cells of ``path`` and the free cells beside it, each mapped
+        to the cells left to the end of the path from there."""
+        passable = self.planner.passable
+        remaining = len(path) - 1
+        corridor = {cell: remaining - i for i, cell in enumerate(path)}
+        for i, cell in enumerate(path):
+            for neighbor in self.planner.neighbors(cell):
+                if passable[neighbor] and corridor.get(neighbor, remaining + 1) > remaining - i + 1:
+                    corridor[neighbor] = remaining - i + 1
+        return corridor
+
+    @staticmethod
+    def _unwind(came_from, cell, step):
+        states = [(cell, step)]
+        while (cell, step) in came_from:
+            cell, step, depart = came_from[(cell, step)]
+            if depart > step:
+                states.append((cell, depart))
+            states.append((cell, step))
+        states.reverse()
+        return states
+
+    def _commit(self, robot_id, target, speed, states, k):
+        table = self.table
+        for (cell, step), (next_cell, next_step) in zip(states, states[1:]):
+            for s in range(step, next_step + 1):
+                table.reserve(robot_id, cell, s)
+                if next_cell != cell:
+                    table.reserve(robot_id, next_cell, s)
+        goal, arrival = states[-1]
+        table.reserve(robot_id, goal, arrival)
+        table.park(robot_id, goal, arrival)
+        if len(states) > 1:
+            self.routes[robot_id] = {"target": target, "speed": speed, "states": states,
+                                     "cursor": 0, "steps_per_cell": k}
+
+    def _replan(self, robot_ids, max_expansions=None):
+        """Replan routes that lost their reservations, lowest id first. A
+        robot that can't be replanned (within what is left of
+        ``max_expansions``, if given) parks where it is, which may push
+        further robots onto the list."""
+        spent_before = self.expansions
+        pending = set(robot_ids)
+        for robot_id in pending:
+            if robot_id in self.routes:
+                self.table.release(robot_id, self._anchor(robot_id)[1] + 1)
+        # Each failure parks a robot for good, so this terminates
+        while pending:
+            robot_id = min(pending)
+            pending.discard(robot_id)
+            route = self.routes.pop(robot_id, None)
+            if route is None:
+                continue
+            anchor = self._anchor_of(route)
+            left = None if max_expansions is None else max(0, max_expansions - (self.expansions - spent_before))
+            if self._plan_from(robot_id, anchor, route["target"], route["speed"], left) is None:
+                for other in self.table.users_from(anchor[0], anchor[1], exclude=robot_id):
+                    if other in self.routes and other not in pending:
+                        self.table.release(other, self._anchor(other)[1] + 1)
+                        pending.add(other)
+
+    # ---------- Execution ----------
+    def advance(self, seconds):
+        """Move the clock on by ``seconds``. Returns ``{robot id: (row, col)}``
+        for robots that entered a new cell; robots that reach the end of
+        their route are dropped from ``routes`` and stay parked there."""
+        self._clock += seconds
+        self.now = int(self._clock / self.step_s + 1e-9)
+        moved = {}
+        for robot_id, route in list(self.routes.items()):
+            states = route["states"]
+            cursor = route["cursor"]
+            while cursor + 1 < len(states) and states[cursor + 1][1] <= self.now:
+                cursor += 1
+            if cursor != route["cursor"]:
+                if states[cursor][0] != states[route["cursor"]][0]:
+                    moved[robot_id] = self.planner.cell_of(states[cursor][0])
+                route["cursor"] = cursor
+            if cursor == len(states) - 1:
+                del self.routes[robot_id]
+        self.table.expire(self.now)
+        return moved
+
+    def delay(self, robot_id, steps, max_expansions=None):
+        """Hold a routed robot on its current cell for ``steps`` more steps
+        and then replan it. Robots whose routes needed that cell in the
+        meantime are replanned as well; with ``max_expansions`` all of that
+        shares the budget, and robots it runs out for park where they are.
+        Returns the delayed robot's new route summary (None if it had no
+        route or can't continue)."""
+        route = self.routes.pop(robot_id, None)
+        if route is None:
+            return None
+        cell = route["states"][route["cursor"]][0]
+        until = self.now + steps
+        self.table.release(robot_id, self.now)
+        self.table.unpark(robot_id)
+
+        bumped = self.table.users_from(cell, self.now, exclude=robot_id)
+        for other in bumped:
+            if other in self.routes:
+                self.table.release(other, self._anchor(other)[1] + 1)
+        # A slot still held is the first of a move onto the cell, which the
+        # other robot is replanned from while it waits on its own cell
+        for step in range(self.now, until + 1):
+            if self.table.holder(cell, step) is None:
+                self.table.reserve(robot_id, cell, step)
+
+        spent_before = self.expansions
+        self._replan(bumped, max_expansions)
+        left = None if max_expansions is None else max(0, max_expansions - (self.expansions - spent_before))
+        summary = self._plan_or_park(robot_id, (cell, until), route["target"], route["speed"], left)
+        if robot_id in self.routes:
+            self.routes[robot_id]["states"].insert(0, (cell, self.now))
+            summary = self.summary(robot_id)
+        return summary
+
+    def halt(self, robot_id):
+        """Stop a routed robot where it is and park it there. Routes that
+        needed its cell later on are replanned."""
+        route = self.routes.pop(robot_id, None)
+        if route is None:
+            return
+        cell = route["states"][route["cursor"]][0]
+        self.table.release(robot_id, self.now)
+        self.table.park(robot_id, cell, self.now)
+        self._replan(self.table.users_from(cell, self.now, exclude=robot_id))
+
+    def halt_all(self):
+        """Stop every robot where it is."""
+        for robot_id in list(self.routes):
+            route = self.routes.pop(robot_id)
+            self.table.release(robot_id)
+            self.table.park(robot_id, route["states"][route["cursor"]][0], self.now)
+
+    def conflicts(self):
+        """Step through every route and parked robot and return the first
+        ``(step, (row, col))`` two robots would be on at once, or None. A
+        moving robot is on both cells for the whole move."""
+        parked = {}
+        for robot_id, cell, since in self.table.parked():
+            if cell in parked:
+                return max(since, parked[cell][1]), self.planner.cell_of(cell)
+            parked[cell] = (robot_id, since)
+        occupied = {}
+        for robot_id, route in self.routes.items():
+            states = route["states"][route["cursor"]:]
+            for (cell, step), (next_cell, next_step) in zip(states, states[1:]):
+                for t in range(max(step, self.now), next_step + 1):
+                    for c in {cell, next_cell}:
+                        other, since = parked.get(c, (robot_id, t))
+                        if other != robot_id and t >= since:
+                            return t, self.planner.cell_of(c)
+                        if occupied.setdefault((t, c), robot_id) != robot_id:
+                            return t, self.planner.cell_of(c)
+        return None
+
+    def replan_all(self):
+        """Replan every active route from where its robot is, lowest id
+        first. Returns ``(routes, cells_remaining, cells_saved,
+        mean_travel_time_s)``."""
+        before = {robot_id: self.summary(robot_id)["distance_cells"] for robot_id in self.routes}
+        for robot_id in before:
+            self.table.release(robot_id, self._anchor(robot_id)[1] + 1)
+
+        remaining = saved = 0
+        travel_times = []
+        for robot_id in sorted(before):
+            # May already have been replanned (or parked) around a robot
+            # that could not be
+            route = self.routes.pop(robot_id, None)
+            if route is None:
+                continue
+            anchor = self._anchor_of(route)
+            self.table.release(robot_id, anchor[1] + 1)
+            summary = self._plan_or_park(robot_id, anchor, route["target"], route["speed"])
+            if summary is None:
+                continue
+            remaining += summary["distance_cells"]
+            saved += max(0, before[robot_id] - summary["distance_cells"])
+            travel_times.append(summary["travel_time_s"])
+        mean_time = sum(travel_times) / len(travel_times) if travel_times else 0.0
+        return len(travel_times), remaining, saved, mean_time
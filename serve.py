@@ -0,0 +1,127 @@
+# serve.py - Production serving: one process owns the fleet, worker processes serve HTTP
+#
+# Usage: python serve.py [--workers 4] [--host 0.0.0.0] [--port 5000]
+#        python serve.py --owner-only --state-address 127.0.0.1:5001
+# The owner process runs main.py's state, engine and persistence, and takes
+# no HTTP traffic itself. Each worker process serves the port (shared
+# between them) with its own threads, answering fleet reads from a replica
+# of the owner's state and forwarding everything else to the owner (see
+# worker_app.py). With --owner-only only the owner runs, for workers under
+# another server (gunicorn -w 4 'worker_app:create_app()'); the key goes
+# in ROBOFLEET_STATE_AUTHKEY (hex) for both.
+import argparse
+import multiprocessing
+import os
+import secrets
+import signal
+import socket
+import sys
+import tempfile
+from multiprocessing.connection import wait
+
+from state_server import parse_address
+
+# Where the owner listens when there are no Unix sockets and no address is given
+DEFAULT_STATE_PORT = 5001
+
+
+def run_owner(address, authkey, ready):
+    import main
+    main.serve_state(address, authkey, on_ready=ready.set)
+
+
+def run_worker(listener, address, authkey):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    from worker_app import create_app
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, create_app(address, authkey), threaded=True,
+                         request_handler=KeepAliveHandler, fd=listener.fileno())
+    server.serve_forever()
+
+
+def bind(host, port):
+    """The listening socket every worker accepts from."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+    return listener
+
+
+def stop(processes):
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(5)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Serve RoboFleet from a state owner and HTTP worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--state-address", default=os.environ.get("ROBOFLEET_STATE_ADDRESS"),
+                        help="host:port or Unix socket path the owner listens on "
+                             "(default: a private socket for this run)")
+    parser.add_argument("--owner-only", action="store_true", help="run the owner alone, for external workers")
+    args = parser.parse_args()
+
+    if os.environ.get("ROBOFLEET_STATE_AUTHKEY"):
+        authkey = bytes.fromhex(os.environ["ROBOFLEET_STATE_AUTHKEY"])
+    elif args.owner_only:
+        parser.error("--owner-only needs the workers' key in ROBOFLEET_STATE_AUTHKEY")
+    else:
+        authkey = secrets.token_bytes(32)
+    if args.state_address:
+        address = parse_address(args.state_address)
+    elif args.owner_only:
+        parser.error("--owner-only needs --state-address")
+    elif hasattr(socket, "AF_UNIX"):
+        address = os.path.join(tempfile.mkdtemp(prefix="robofleet-"), "state.sock")
+    else:
+        address = ("127.0.0.1", DEFAULT_STATE_PORT)
+
+    if args.owner_only:
+        import main
+        main.serve_state(address, authkey)
+        return 0
+
+    # Spawned, so workers never import main and its state
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    owner = context.Process(target=run_owner, args=(address, authkey, ready), name="robofleet-owner")
+    owner.start()
+    while not ready.wait(0.5):
+        if not owner.is_alive():
+            print("❌ Fleet state owner failed to start")
+            return 1
+    listener = bind(args.host, args.port)
+    workers = [context.Process(target=run_worker, args=(listener, address, authkey), name=f"robofleet-worker-{i}")
+               for i in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    listener.close()
+    print(f"🚀 Serving http://{args.host}:{args.port} from {args.workers} worker process(es)")
+
+    # Stop everything when any process dies, or on SIGTERM / Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    processes = [owner] + workers
+    try:
+        wait([process.sentinel for process in processes])
+        print("❌ A server process exited; stopping")
+        return 1
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        stop(processes)
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
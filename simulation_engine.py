@@ -0,0 +1,65 @@
+# simulation_engine.py - Fixed-rate background simulation engine
+import threading
+import time
+
+
+class SimulationEngine:
+    """Runs the fleet simulation tick on its own thread at a fixed rate.
+
+    The tick function owns all state changes; request handlers only read the
+    snapshot it publishes, so simulation speed no longer depends on how many
+    dashboards are polling.
+    """
+
+    def __init__(self, tick_fn, tick_rate_hz=1.0, on_tick=None):
+        if tick_rate_hz <= 0:
+            raise ValueError("tick_rate_hz must be positive")
+        self.tick_fn = tick_fn
+        # Called with each tick's duration in seconds
+        self.on_tick = on_tick
+        self.tick_rate_hz = tick_rate_hz
+        self.tick_interval = 1.0 / tick_rate_hz
+        self.tick_count = 0
+        self.last_tick_duration = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_alive:
+            return False
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="simulation-engine", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self.tick_fn()
+            except Exception as e:
+                print(f"⚠️ Simulation tick failed: {e}")
+            self.tick_count += 1
+            self.last_tick_duration = time.monotonic() - started
+            if self.on_tick is not None:
+                self.on_tick(self.last_tick_duration)
+
+            # Schedule against a fixed timeline; if a tick overran, skip ahead
+            # instead of bursting to catch up.
+            next_tick += self.tick_interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                next_tick = time.monotonic()
+                delay = 0
+            self._stop_event.wait(delay)
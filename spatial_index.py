@@ -0,0 +1,110 @@
+# spatial_index.py - Grid-bucket spatial index for robot positions
+import heapq
+
+
+class SpatialIndex:
+    """Buckets points into square tiles of ``bucket_size`` cells.
+
+    Region queries only visit the tiles overlapping the region, and
+    nearest-neighbour queries search tiles in rings outward from the query
+    cell, stopping once no unvisited tile can hold anything closer. Both are
+    independent of how many robots are elsewhere on the floor.
+    """
+
+    def __init__(self, bucket_size=16):
+        self.bucket_size = bucket_size
+        self._buckets = {}     # (bucket_row, bucket_col) -> {key: (row, col)}
+        self._positions = {}   # key -> (row, col)
+        # Bucket bounds ever used (never shrink); limit the ring search
+        self._bounds = None
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def _bucket(self, cell):
+        return cell[0] // self.bucket_size, cell[1] // self.bucket_size
+
+    def position(self, key):
+        return self._positions.get(key)
+
+    def insert(self, key, cell):
+        self.remove(key)
+        self._positions[key] = cell
+        bucket = self._bucket(cell)
+        self._buckets.setdefault(bucket, {})[key] = cell
+        if self._bounds is None:
+            self._bounds = [bucket[0], bucket[1], bucket[0], bucket[1]]
+        else:
+            bounds = self._bounds
+            bounds[0] = min(bounds[0], bucket[0])
+            bounds[1] = min(bounds[1], bucket[1])
+            bounds[2] = max(bounds[2], bucket[0])
+            bounds[3] = max(bounds[3], bucket[1])
+
+    def remove(self, key):
+        cell = self._positions.pop(key, None)
+        if cell is None:
+            return False
+        bucket = self._bucket(cell)
+        members = self._buckets[bucket]
+        del members[key]
+        if not members:
+            del self._buckets[bucket]
+        return True
+
+    def query_region(self, row0, col0, row1, col1):
+        """Keys inside the inclusive rectangle, as ``{key: (row, col)}``."""
+        found = {}
+        b_row0, b_col0 = self._bucket((row0, col0))
+        b_row1, b_col1 = self._bucket((row1, col1))
+        for b_row in range(b_row0, b_row1 + 1):
+            for b_col in range(b_col0, b_col1 + 1):
+                for key, (row, col) in self._buckets.get((b_row, b_col), {}).items():
+                    if row0 <= row <= row1 and col0 <= col <= col1:
+                        found[key] = (row, col)
+        return found
+
+    def nearest(self, cell, k=1, predicate=None):
+        """Up to ``k`` ``(distance, key, (row, col))`` tuples closest to
+        ``cell`` by Manhattan distance, nearest first."""
+        if not self._positions or k <= 0:
+            return []
+        center_row, center_col = self._bucket(cell)
+        best = []  # max-heap of (-distance, key, position)
+        max_ring = self._max_ring(center_row, center_col)
+
+        for ring in range(max_ring + 1):
+            # Any cell in ring r is at least (r - 1) * bucket_size + 1 away
+            if len(best) == k and ring > 0 and (ring - 1) * self.bucket_size + 1 > -best[0][0]:
+                break
+            for bucket in self._ring(center_row, center_col, ring):
+                for key, position in self._buckets.get(bucket, {}).items():
+                    if predicate is not None and not predicate(key):
+                        continue
+                    distance = abs(position[0] - cell[0]) + abs(position[1] - cell[1])
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, key, position))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, key, position))
+
+        return sorted((-negated, key, position) for negated, key, position in best)
+
+    def _max_ring(self, center_row, center_col):
+        row0, col0, row1, col1 = self._bounds
+        return max(abs(row0 - center_row), abs(row1 - center_row),
+                   abs(col0 - center_col), abs(col1 - center_col))
+
+    @staticmethod
+    def _ring(center_row, center_col, ring):
+        if ring == 0:
+            yield center_row, center_col
+            return
+        for col in range(center_col - ring, center_col + ring + 1):
+            yield center_row - ring, col
+            yield center_row + ring, col
+        for row in range(center_row - ring + 1, center_row + ring):
+            yield row, center_col - ring
+            yield row, center_col + ring
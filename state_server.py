@@ -0,0 +1,288 @@
+# state_server.py - Fleet state shared from its owner process to HTTP worker processes
+import queue
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from concurrency import AtomicCounter
+
+# Updates a worker may fall behind by before it is sent the full state again
+MAX_PENDING_UPDATES = 1000
+# Idle request connections a worker keeps open to the owner
+REQUEST_POOL_SIZE = 16
+# Seconds between a worker's reports of the reads it served itself
+REPORT_EVERY_S = 1.0
+# Seconds between a worker's attempts to reach an owner that is gone
+RECONNECT_DELAY_S = 1.0
+
+# Headers that describe one hop or the body's framing, which the other side
+# works out afresh
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "content-length"}
+
+
+def parse_address(text):
+    """``host:port`` (or ``:port``) for TCP; anything else is the path of
+    a Unix socket."""
+    host, separator, port = text.rpartition(":")
+    if separator and port.isdigit() and "/" not in text:
+        return host or "127.0.0.1", int(port)
+    return text
+
+
+class _Feed:
+    """Updates waiting to go to one subscribed worker. A worker too far
+    behind is sent the full state again instead of the backlog."""
+
+    def __init__(self):
+        self.updates = queue.Queue(MAX_PENDING_UPDATES)
+        self.resync = False
+
+    def offer(self, item):
+        try:
+            self.updates.put_nowait(item)
+        except queue.Full:
+            self.resync = True
+
+
+class StateServer:
+    """Serves the process that owns the fleet to worker processes over
+    ``multiprocessing.connection``. A worker connection either
+
+    - subscribes (``("subscribe",)``): it is sent ``("state", seq,
+      full_state())`` and then ``("update", seq, update)`` for every
+      ``publish``, in order; or
+    - sends ``("request", method, path, query, headers, body, remote_addr)``,
+      which runs through ``app`` and is answered with ``(status, headers,
+      body, seq)``, or reports on the reads the worker answered itself:
+      ``("api_calls", n)``, passed to ``count_api_calls``, and
+      ``("metrics", report)``, a ``RequestMetrics.drain`` passed to
+      ``merge_metrics``.
+
+    ``seq`` counts publishes, so a worker can wait for its replica to catch
+    up with the state a forwarded request left behind.
+    """
+
+    def __init__(self, app, address, authkey, lock, full_state, count_api_calls=None, merge_metrics=None):
+        self.app = app
+        self.authkey = authkey
+        self.lock = lock
+        self.full_state = full_state
+        self.count_api_calls = count_api_calls
+        self.merge_metrics = merge_metrics
+        self.sequence = 0
+        self._address = address
+        self._listener = None
+        self._feeds = set()
+        self._feeds_lock = threading.Lock()
+
+    @property
+    def address(self):
+        """The bound address (with the real port when started on port 0)."""
+        return self._listener.address if self._listener is not None else self._address
+
+    def start(self):
+        self._listener = Listener(self._address, authkey=self.authkey)
+        threading.Thread(target=self._accept, name="state-server", daemon=True).start()
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.close()
+
+    def publish(self, update):
+        """Queue ``update`` for every subscribed worker. Updates published
+        while holding ``lock`` reach each worker in the order they were
+        made."""
+        with self._feeds_lock:
+            self.sequence += 1
+            item = ("update", self.sequence, update)
+            feeds = list(self._feeds)
+        for feed in feeds:
+            feed.offer(item)
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self._listener.accept()
+            except AuthenticationError:
+                continue
+            except OSError:
+                return      # closed
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        client = self.app.test_client()
+        try:
+            while True:
+                message = connection.recv()
+                if message[0] == "subscribe":
+                    self._send_feed(connection)
+                elif message[0] == "request":
+                    connection.send(self._dispatch(client, *message[1:]))
+                elif message[0] == "api_calls" and self.count_api_calls is not None:
+                    self.count_api_calls(message[1])
+                elif message[0] == "metrics" and self.merge_metrics is not None:
+                    self.merge_metrics(message[1])
+        except (EOFError, OSError):
+            pass        # the worker went away
+        finally:
+            connection.close()
+
+    def _snapshot(self, feed):
+        """The full state and the publish it is current to, with the feed
+        emptied of anything older. Publishes wait meanwhile."""
+        with self.lock:
+            while True:
+                try:
+                    feed.updates.get_nowait()
+                except queue.Empty:
+                    break
+            feed.resync = False
+            state = self.full_state()
+            with self._feeds_lock:
+                self._feeds.add(feed)
+                return ("state", self.sequence, state)
+
+    def _send_feed(self, connection):
+        feed = _Feed()
+        try:
+            connection.send(self._snapshot(feed))
+            while True:
+                item = feed.updates.get()
+                # Updates queued before the overflow are covered by the new
+                # full state, so this one is dropped along with them
+                connection.send(self._snapshot(feed) if feed.resync else item)
+        finally:
+            with self._feeds_lock:
+                self._feeds.discard(feed)
+
+    def _dispatch(self, client, method, path, query_string, headers, body, remote_addr):
+        response = client.open(path, method=method, query_string=query_string, headers=headers,
+                               data=body, environ_overrides={"REMOTE_ADDR": remote_addr})
+        try:
+            return (response.status,
+                    [(name, value) for name, value in response.headers if name.lower() not in HOP_HEADERS],
+                    response.get_data(), self.sequence)
+        finally:
+            response.close()
+
+
+class StateClient:
+    """A worker's side of the ``StateServer``. A background thread keeps
+    one subscription open, handing the full state to ``on_state(state)``
+    and each update to ``on_update(update)`` (and reconnecting, to be sent
+    the full state afresh, if the owner restarts). Requests are forwarded
+    over a small pool of further connections. ``api_calls`` and what
+    ``metrics`` (a ``RequestMetrics``) records are reported to the owner
+    every REPORT_EVERY_S."""
+
+    def __init__(self, address, authkey, on_state, on_update, metrics=None):
+        self.address = address
+        self.authkey = authkey
+        self.on_state = on_state
+        self.on_update = on_update
+        self.metrics = metrics
+        self.loaded = False         # the first full state is in
+        self.applied = 0            # seq of the last state or update handed on
+        self.api_calls = AtomicCounter()
+        self._applied = threading.Condition()
+        self._idle = queue.LifoQueue(REQUEST_POOL_SIZE)
+        self._reported_calls = 0
+
+    def start(self, timeout=30.0):
+        """Start following the owner; returns once the first full state is
+        in, or raises TimeoutError if the owner can't be reached."""
+        threading.Thread(target=self._follow, name="state-feed", daemon=True).start()
+        threading.Thread(target=self._report, name="state-report", daemon=True).start()
+        with self._applied:
+            if not self._applied.wait_for(lambda: self.loaded, timeout):
+                raise TimeoutError(f"No fleet state from {self.address} after {timeout:g}s")
+
+    def wait_for(self, sequence, timeout):
+        """Block until the update numbered ``sequence`` has been applied.
+        Returns False on timeout."""
+        with self._applied:
+            return self._applied.wait_for(lambda: self.applied >= sequence, timeout)
+
+    def _follow(self):
+        while True:
+            try:
+                connection = Client(self.address, authkey=self.authkey)
+            except (OSError, AuthenticationError):
+                time.sleep(RECONNECT_DELAY_S)
+                continue
+            # Pooled connections are to the owner that went away, if any
+            self._close_idle()
+            try:
+                connection.send(("subscribe",))
+                while True:
+                    kind, sequence, payload = connection.recv()
+                    if kind == "state":
+                        self.on_state(payload)
+                    else:
+                        self.on_update(payload)
+                    with self._applied:
+                        self.loaded = True
+                        self.applied = sequence
+                        self._applied.notify_all()
+            except (EOFError, OSError):
+                pass
+            finally:
+                connection.close()
+            time.sleep(RECONNECT_DELAY_S)
+
+    def _close_idle(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _request(self, message, reply=True):
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = Client(self.address, authkey=self.authkey)
+        try:
+            connection.send(message)
+            result = connection.recv() if reply else None
+        except BaseException:
+            connection.close()
+            raise
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+        return result
+
+    def forward(self, method, path, query_string, headers, body, remote_addr):
+        """Run a request in the owner. Returns ``(status, headers, body,
+        seq)``; raises OSError, EOFError or AuthenticationError if the
+        owner can't be reached."""
+        return self._request(("request", method, path, query_string, headers, body, remote_addr))
+
+    def _report(self):
+        while True:
+            time.sleep(REPORT_EVERY_S)
+            self._report_api_calls()
+            if self.metrics is not None:
+                self._report_metrics()
+
+    def _report_api_calls(self):
+        total = self.api_calls.value
+        if total == self._reported_calls:
+            return
+        try:
+            self._request(("api_calls", total - self._reported_calls), reply=False)
+        except (OSError, EOFError, AuthenticationError):
+            return      # counted in the next report
+        self._reported_calls = total
+
+    def _report_metrics(self):
+        report = self.metrics.drain()
+        if not any(report.values()):
+            return
+        try:
+            self._request(("metrics", report), reply=False)
+        except (OSError, EOFError, AuthenticationError):
+            self.metrics.merge(report)      # sent with the next report
@@ -0,0 +1,163 @@
+# task_history.py - Bounded, indexed task history with cursor pagination
+import threading
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+
+
+class TaskHistory:
+    """Ring buffer of task/control events.
+
+    Every entry gets a sequence id which doubles as the pagination cursor.
+    Entries are also indexed by robot id and task type (bounded the same way),
+    and the "today" and "ai_optimized" counters are kept up to date on append,
+    so queries never scan the whole history.
+    """
+
+    def __init__(self, capacity=10000):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._buffer = [None] * capacity
+        self._lock = threading.Lock()
+        self._by_robot = {}
+        self._by_type = {}
+        self.total_recorded = 0
+        self.ai_optimized_count = 0
+        self._today = None
+        self._today_count = 0
+
+    def __len__(self):
+        return min(self.total_recorded, self.capacity)
+
+    @staticmethod
+    def _type_of(entry):
+        return entry.get("task_type", entry.get("type"))
+
+    @property
+    def _oldest_seq(self):
+        return max(1, self.total_recorded - self.capacity + 1)
+
+    def _get(self, seq):
+        return self._buffer[seq % self.capacity]
+
+    def append(self, entry):
+        with self._lock:
+            seq = self.total_recorded + 1
+
+            # Evict the oldest entry (and its index slots) when full
+            if seq > self.capacity:
+                evicted = self._get(seq)
+                self._by_robot[evicted.get("robot_id")].popleft()
+                self._by_type[self._type_of(evicted)].popleft()
+
+            entry = dict(entry, id=seq)
+            self._buffer[seq % self.capacity] = entry
+            self.total_recorded = seq
+            self._by_robot.setdefault(entry.get("robot_id"), deque()).append(seq)
+            self._by_type.setdefault(self._type_of(entry), deque()).append(seq)
+
+            # Precomputed stats
+            if "ai" in entry.get("task_name", "").lower():
+                self.ai_optimized_count += 1
+            today = datetime.now().date()
+            if today != self._today:
+                self._today = today
+                self._today_count = 0
+            self._today_count += 1
+            return seq
+
+    @property
+    def today_count(self):
+        return self._today_count if self._today == datetime.now().date() else 0
+
+    def since(self, seq):
+        """Retained entries with an id greater than ``seq``, oldest first."""
+        with self._lock:
+            first = max(seq + 1, self._oldest_seq)
+            return [self._get(i) for i in range(first, self.total_recorded + 1)]
+
+    def to_state(self):
+        with self._lock:
+            return {
+                "entries": [self._get(i) for i in range(self._oldest_seq, self.total_recorded + 1)],
+                "total_recorded": self.total_recorded,
+                "ai_optimized_count": self.ai_optimized_count,
+                "today": self._today.isoformat() if self._today else None,
+                "today_count": self._today_count
+            }
+
+    @classmethod
+    def from_state(cls, state, capacity=10000):
+        history = cls(capacity)
+        # Restored entries keep their ids, so they go straight into their
+        # slots; appending them would evict from slots that are still empty
+        for entry in state["entries"][-capacity:]:
+            seq = entry["id"]
+            history._buffer[seq % capacity] = entry
+            history._by_robot.setdefault(entry.get("robot_id"), deque()).append(seq)
+            history._by_type.setdefault(cls._type_of(entry), deque()).append(seq)
+        history.total_recorded = state["total_recorded"]
+        history.ai_optimized_count = state["ai_optimized_count"]
+        history._today = datetime.fromisoformat(state["today"]).date() if state["today"] else None
+        history._today_count = state["today_count"]
+        return history
+
+    def recent(self, limit=10):
+        return self.query(limit=limit)["entries"]
+
+    def query(self, limit=10, cursor=None, robot_id=None, task_type=None, start=None, end=None):
+        """Return entries newest-first.
+
+        ``cursor`` is the ``next_cursor`` of a previous page (only entries with
+        a smaller id are returned). ``start``/``end`` are ISO timestamps
+        bounding the entry ``time``. Cost is O(log n + limit) for the time
+        bounds plus the entries skipped by a robot/type filter combination.
+        """
+        with self._lock:
+            oldest = self._oldest_seq
+            newest = self.total_recorded
+            if cursor is not None:
+                newest = min(newest, cursor - 1)
+            if end is not None:
+                newest = min(newest, self._last_seq_not_after(oldest, newest, end))
+
+            # Walk the narrowest index available, newest first
+            if robot_id is not None or task_type is not None:
+                candidates = []
+                if robot_id is not None:
+                    candidates.append(self._by_robot.get(robot_id, ()))
+                if task_type is not None:
+                    candidates.append(self._by_type.get(task_type, ()))
+                seqs = min(candidates, key=len)
+                position = bisect_left(seqs, newest + 1)
+                walk = (seqs[i] for i in range(position - 1, -1, -1))
+            else:
+                walk = range(newest, oldest - 1, -1)
+
+            entries = []
+            next_cursor = None
+            for seq in walk:
+                entry = self._get(seq)
+                if start is not None and entry.get("time", "") < start:
+                    break
+                if robot_id is not None and entry.get("robot_id") != robot_id:
+                    continue
+                if task_type is not None and self._type_of(entry) != task_type:
+                    continue
+                if len(entries) == limit:
+                    next_cursor = entries[-1]["id"]
+                    break
+                entries.append(entry)
+
+            return {"entries": entries, "next_cursor": next_cursor}
+
+    def _last_seq_not_after(self, low, high, end):
+        # Entries are appended in time order, so binary search on time
+        while low <= high:
+            mid = (low + high) // 2
+            if self._get(mid).get("time", "") <= end:
+                low = mid + 1
+            else:
+                high = mid - 1
+        return high
@@ -0,0 +1,83 @@
+# task_matcher.py - Minimum-cost assignment of tasks to robots
+import heapq
+
+
+def match(costs):
+    """Assign each row (task) at most one column (robot): as many rows as
+    possible, earlier rows first when not all of them fit, at the minimum
+    total cost for the rows assigned.
+
+    ``costs`` holds one ``{column: cost}`` dict per row; a column missing
+    from a row's dict can't take that row. Rows can share a dict. Returns a
+    list with the assigned column (or None) for each row.
+
+    This is the Hungarian method in its shortest augmenting path form: rows
+    are added one at a time, and each runs a Dijkstra search over the
+    columns, made non-negative by per-column potentials, to the nearest
+    free column, shifting earlier rows along the way where that is cheaper.
+    Only the listed row/column pairs are visited, so sparse cost tables
+    (each task only offered its best candidates) stay cheap. Rows sharing a
+    dict are interchangeable, and each search expands such a group once.
+    """
+    potential = {}      # column -> v; c(row, col) - v[col] is smallest at the row's own column
+    owner = {}          # column -> row
+    assigned = [None] * len(costs)
+
+    for row, row_costs in enumerate(costs):
+        distance = {}
+        previous = {}   # column -> column it was reached from (None: from the new row)
+        heap = []
+        for column, cost in row_costs.items():
+            d = cost - potential.get(column, 0)
+            if d < distance.get(column, d + 1):
+                distance[column] = d
+                previous[column] = None
+                heap.append((d, column))
+        heapq.heapify(heap)
+
+        done = {}
+        expanded = set()    # ids of the cost dicts already expanded
+        free = None
+        while heap:
+            d, column = heapq.heappop(heap)
+            if column in done or d > distance[column]:
+                continue
+            done[column] = d
+            other = owner.get(column)
+            if other is None:
+                free = column
+                break
+            # Move the row holding this column to another of its columns.
+            # Every row with the same dict has the same (smallest) reduced
+            # cost on its own column, so the first one popped is the best.
+            other_costs = costs[other]
+            if id(other_costs) in expanded:
+                continue
+            expanded.add(id(other_costs))
+            base = d - (other_costs[column] - potential.get(column, 0))
+            for next_column, cost in other_costs.items():
+                if next_column in done:
+                    continue
+                next_d = base + cost - potential.get(next_column, 0)
+                if next_d < distance.get(next_column, next_d + 1):
+                    distance[next_column] = next_d
+                    previous[next_column] = column
+                    heapq.heappush(heap, (next_d, next_column))
+        if free is None:
+            continue
+
+        # Keep every row's own column its cheapest after the shift
+        end = done[free]
+        for column, d in done.items():
+            potential[column] = potential.get(column, 0) - (end - d)
+
+        column = free
+        while True:
+            came_from = previous[column]
+            holder = row if came_from is None else owner[came_from]
+            owner[column] = holder
+            assigned[holder] = column
+            if came_from is None:
+                break
+            column = came_from
+    return assigned
@@ -0,0 +1,192 @@
+# task_queue.py - Priority task queues and the scheduler's pending-task store
+import heapq
+from datetime import datetime
+
+
+def deadline_timestamp(deadline):
+    """Epoch seconds for an ISO ``deadline``, or None. Raises ValueError
+    for a malformed timestamp."""
+    return datetime.fromisoformat(deadline).timestamp() if deadline else None
+
+
+class TaskQueue:
+    """Pending tasks, most urgent first: higher ``priority``, then earlier
+    ``deadline``, then submission order (task id).
+
+    A binary heap, so push and pop are O(log n). Cancelled tasks stay in
+    the heap and are skipped when they reach the top.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._live = {}     # task id -> heap entry
+
+    def __len__(self):
+        return len(self._live)
+
+    @staticmethod
+    def _key(task):
+        deadline = deadline_timestamp(task.get("deadline"))
+        return (-task.get("priority", 0), deadline if deadline is not None else float("inf"), task["id"])
+
+    def push(self, task):
+        entry = (self._key(task), task)
+        self._live[task["id"]] = entry
+        heapq.heappush(self._heap, entry)
+
+    def _prune(self):
+        while self._heap and self._live.get(self._heap[0][1]["id"]) is not self._heap[0]:
+            heapq.heappop(self._heap)
+
+    def peek(self):
+        self._prune()
+        return self._heap[0][1] if self._heap else None
+
+    def pop(self):
+        self._prune()
+        if not self._heap:
+            return None
+        _, task = heapq.heappop(self._heap)
+        del self._live[task["id"]]
+        return task
+
+    def remove(self, task_id):
+        """Cancel a pending task. Returns it, or None if it isn't queued."""
+        entry = self._live.pop(task_id, None)
+        if entry is None:
+            return None
+        # Compact once cancelled entries dominate the heap
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._live):
+            self._heap = list(self._live.values())
+            heapq.heapify(self._heap)
+        return entry[1]
+
+    def is_expired(self, task_id, now):
+        return self._live[task_id][0][1] < now
+
+    def first(self, limit):
+        """The ``limit`` most urgent tasks, in order."""
+        return [task for _, task in heapq.nsmallest(limit, self._live.values())]
+
+    def tasks(self):
+        return [task for _, task in self._live.values()]
+
+
+class TaskScheduler:
+    """Pending tasks for the fleet: one queue per robot for tasks aimed at
+    a robot, plus a fleet-wide queue for tasks any robot can take.
+
+    Every change is also recorded in ``changes`` (``("add", task)`` or
+    ``("remove", task id)``) until ``drain_changes`` is called, so the
+    event log can persist the queues.
+    """
+
+    def __init__(self, tasks=()):
+        self.fleet_queue = TaskQueue()
+        self.robot_queues = {}
+        self._queue_of = {}     # task id -> the TaskQueue holding it
+        self.next_id = 1
+        self.expired = 0
+        self.changes = []
+        for task in tasks:
+            self._add(task)
+        self.changes.clear()
+
+    def __len__(self):
+        return len(self._queue_of)
+
+    def _add(self, task):
+        robot_id = task.get("robot_id")
+        queue = self.fleet_queue if robot_id is None else self.robot_queues.setdefault(robot_id, TaskQueue())
+        queue.push(task)
+        self._queue_of[task["id"]] = queue
+        self.next_id = max(self.next_id, task["id"] + 1)
+        self.changes.append(("add", task))
+
+    def submit(self, task_type, priority=0, deadline=None, robot_id=None):
+        """Queue a task (for ``robot_id``, or any robot if None). Returns
+        the task record."""
+        deadline_timestamp(deadline)
+        task = {
+            "id": self.next_id,
+            "task_type": task_type,
+            "priority": priority,
+            "deadline": deadline,
+            "robot_id": robot_id,
+            "submitted": datetime.now().isoformat()
+        }
+        self._add(task)
+        return task
+
+    def requeue(self, task):
+        """Put back a task taken by ``next_for``/``take_fleet_tasks`` that
+        couldn't be dispatched; it keeps its place in line."""
+        self._add(task)
+
+    def cancel(self, task_id):
+        queue = self._queue_of.pop(task_id, None)
+        if queue is None:
+            return None
+        self.changes.append(("remove", task_id))
+        return queue.remove(task_id)
+
+    def _take(self, queue, now):
+        """Pop the most urgent task of ``queue`` whose deadline hasn't
+        passed; expired tasks met on the way are dropped."""
+        while True:
+            task = queue.peek()
+            if task is None:
+                return None
+            expired = queue.is_expired(task["id"], now)
+            queue.pop()
+            del self._queue_of[task["id"]]
+            self.changes.append(("remove", task["id"]))
+            if not expired:
+                return task
+            self.expired += 1
+
+    def has_tasks_for(self, robot_id):
+        return bool(self.robot_queues.get(robot_id))
+
+    def next_for(self, robot_id, now):
+        """Take the next task queued for this robot, or None."""
+        queue = self.robot_queues.get(robot_id)
+        return self._take(queue, now) if queue else None
+
+    def take_fleet_tasks(self, limit, now):
+        """Take up to ``limit`` fleet-wide tasks, most urgent first."""
+        tasks = []
+        while len(tasks) < limit:
+            task = self._take(self.fleet_queue, now)
+            if task is None:
+                break
+            tasks.append(task)
+        return tasks
+
+    def pending(self, robot_id=None, limit=20):
+        """The most urgent pending tasks for one robot, or fleet-wide."""
+        queue = self.fleet_queue if robot_id is None else self.robot_queues.get(robot_id)
+        return queue.first(limit) if queue else []
+
+    def counts(self):
+        return {
+            "total": len(self),
+            "fleet": len(self.fleet_queue),
+            "robots": {robot_id: len(queue) for robot_id, queue in self.robot_queues.items() if queue},
+            "expired": self.expired
+        }
+
+    def drain_changes(self):
+        changes, self.changes = self.changes, []
+        return changes
+
+    def apply_change(self, change):
+        """Replay one recorded change (from the event log)."""
+        op, value = change
+        if op == "add":
+            self._add(value)
+        else:
+            self.cancel(value)
+
+    def to_state(self):
+        return [task for queue in [self.fleet_queue, *self.robot_queues.values()] for task in queue.tasks()]
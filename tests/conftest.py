@@ -0,0 +1,31 @@
+# conftest.py - Import path, environment and fixtures shared by the tests
+import copy
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# main.py reads its configuration when imported: no event log, fixed seed
+os.environ["ROBOFLEET_DATA_DIR"] = ""
+os.environ.setdefault("ROBOFLEET_SEED", "1")
+
+
+@pytest.fixture
+def model():
+    """The server module, with its fleet, routes and charger bookings put
+    back as they were once the test is done."""
+    import main
+    from fleet_store import FleetStore
+
+    with main.state_lock:
+        robots = [robot.to_dict() for robot in main.fleet]
+        task_execution = copy.deepcopy(main.fleet.task_execution)
+    yield main
+    with main.state_lock:
+        for robot in main.fleet:
+            main.coordinator.cancel(robot.id)
+            main.charging.cancel(robot.id)
+        main.fleet = FleetStore(robots, task_execution)
+        main.position_robots()
@@ -0,0 +1,100 @@
+from charging_scheduler import ChargingScheduler
+
+LOW_ROBOT = 2       # in maintenance with a low battery in the default fleet
+
+
+def no_route(*args, **kwargs):
+    return None
+
+
+def test_robot_without_charger_route_is_not_charging(model, monkeypatch):
+    monkeypatch.setattr(model.coordinator, "plan", no_route)
+    with model.state_lock:
+        model.plan_charging()
+        robot = model.fleet.get(LOW_ROBOT)
+
+        assert robot.status == "maintenance"
+        assert LOW_ROBOT not in model.charging.bookings
+        assert not model.coordinator.is_moving(LOW_ROBOT)
+
+
+def test_robot_leaves_once_routed(model, monkeypatch):
+    with model.state_lock:
+        monkeypatch.setattr(model.coordinator, "plan", no_route)
+        model.plan_charging()
+        monkeypatch.undo()
+        model.plan_charging()
+        robot = model.fleet.get(LOW_ROBOT)
+
+        assert robot.status == "charging"
+        assert model.coordinator.is_moving(LOW_ROBOT)
+        assert model.coordinator.summary(LOW_ROBOT)["to"] != [robot.row, robot.col]
+
+
+def test_search_budget_spent_keeps_robots_waiting(model, monkeypatch):
+    monkeypatch.setitem(model.SIMULATION_CONFIG, "charge_search_budget", 0)
+    with model.state_lock:
+        model.plan_charging()
+
+        assert model.fleet.get(LOW_ROBOT).status == "maintenance"
+        assert model.charging.due(LOW_ROBOT)
+
+
+def test_failed_trip_keeps_task(model, monkeypatch):
+    with model.state_lock:
+        model.apply_task_assignment(1, "move")
+        route = model.coordinator.summary(1)
+        assert route is not None
+        model.book_charger(1, urgent=True)
+        monkeypatch.setattr(model.coordinator, "plan", no_route)
+
+        assert model.send_to_charger(1, max_expansions=1000) is None
+        assert model.fleet.get(1).status == "working"
+        assert model.coordinator.summary(1) == route
+        assert len(model.scheduler.robot_queues.get(1) or ()) == 0
+
+
+def test_booked_robot_charges_only_on_its_charger(model):
+    with model.state_lock:
+        model.book_charger(LOW_ROBOT, urgent=True)
+        charger = model.charging.bookings[LOW_ROBOT]["charger"]
+
+        assert not model.on_charger(model.fleet.get(LOW_ROBOT))
+        model.fleet.update(LOW_ROBOT, row=charger[0], col=charger[1])
+        assert model.on_charger(model.fleet.get(LOW_ROBOT))
+        model.charging.cancel(LOW_ROBOT)
+        model.fleet.update(LOW_ROBOT, row=0, col=0)
+        assert model.on_charger(model.fleet.get(LOW_ROBOT))
+
+
+def test_late_booking_is_kept_while_prediction_holds():
+    charging = ChargingScheduler([(0, 0)])
+    travel = lambda charger: 0
+    # Robots 1, 3 and 4 fill the charger up to robot 2's deadline
+    for robot_id in (1, 3, 4):
+        charging.book(robot_id, (0, 0), 60, travel)
+    late = charging.book(2, (0, 0), 60, travel)
+    assert late["start"] > late["deadline"]
+
+    charging.advance()
+    assert not charging.needs_booking(2, 58)
+    assert charging.needs_booking(2, 40)
+
+
+def test_nearest_chargers_match_a_full_sort():
+    chargers = [(0, col) for col in range(0, 460, 10)] + [(row, 499) for row in range(0, 500, 25)]
+    charging = ChargingScheduler(chargers, bucket_size=62)
+    distance = lambda cell, charger: abs(cell[0] - charger[0]) + abs(cell[1] - charger[1])
+    for cell in [(0, 0), (499, 0), (250, 250), (499, 499), (10, 480)]:
+        expected = sorted(distance(cell, charger) for charger in chargers)[:charging.candidates]
+        assert [distance(cell, charger) for charger in charging.nearest_chargers(cell)] == expected
+
+
+def test_bookings_per_tick_are_capped_most_urgent_first(model, monkeypatch):
+    monkeypatch.setitem(model.SIMULATION_CONFIG, "charge_booking_limit", 2)
+    with model.state_lock:
+        model.fleet.update(1, battery=60)
+        model.fleet.update(4, battery=25)
+        model.plan_charging()
+
+        assert set(model.charging.bookings) == {LOW_ROBOT, 4}
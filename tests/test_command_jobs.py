@@ -0,0 +1,54 @@
+import threading
+
+from command_jobs import JobRunner
+
+
+class CancelOnWorkerRelease:
+    """A lock that runs ``cancel_queued`` on another thread the first time
+    a worker releases it, i.e. as soon as the worker has looked at its
+    job."""
+
+    def __init__(self, runner):
+        self.runner = runner
+        self.inner = threading.Lock()
+        self.cancelled = None
+
+    def __enter__(self):
+        self.inner.acquire()
+
+    def __exit__(self, *exc):
+        self.inner.release()
+        if self.cancelled is None and threading.current_thread().name.startswith("command-job"):
+            self.cancelled = []
+            cancelling = threading.Thread(
+                target=lambda: self.cancelled.append(self.runner.cancel_queued("Emergency stop")))
+            cancelling.start()
+            cancelling.join()
+
+
+def test_job_is_either_cancelled_or_run():
+    ran = threading.Event()
+    runner = JobRunner(workers=1)
+    lock = runner._lock = CancelOnWorkerRelease(runner)
+
+    job = runner.submit("move", {}, ran.set)
+    runner._executor.shutdown(wait=True)
+
+    record = runner.get(job["id"])
+    if lock.cancelled == [1]:
+        assert record["status"] == "cancelled" and not ran.is_set()
+    else:
+        assert record["status"] == "done" and ran.is_set()
+
+
+def test_cancel_queued_leaves_running_jobs():
+    started = threading.Event()
+    release = threading.Event()
+    runner = JobRunner(workers=1)
+    job = runner.submit("move", {}, lambda: (started.set(), release.wait()))
+    started.wait(5)
+
+    assert runner.cancel_queued("Emergency stop") == 0
+    release.set()
+    runner._executor.shutdown(wait=True)
+    assert runner.get(job["id"])["status"] == "done"
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from concurrency import PriorityRLock
+
+
+def run_in_thread(fn, reraise=False):
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = fn()
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join(5)
+    if reraise and "error" in outcome:
+        raise outcome["error"]
+    return outcome.get("result")
+
+
+def test_lock_is_reentrant_and_counts_depth():
+    lock = PriorityRLock()
+    with lock:
+        with lock.priority():
+            with lock:
+                pass
+        assert not run_in_thread(lambda: lock.acquire(blocking=False))
+    assert run_in_thread(lambda: lock.acquire(blocking=False))
+
+
+def test_only_owner_can_release():
+    lock = PriorityRLock()
+    with pytest.raises(RuntimeError):
+        lock.release()
+    lock.acquire()
+    with pytest.raises(RuntimeError):
+        run_in_thread(lock.release, reraise=True)
+    lock.release()
+
+
+def test_priority_thread_goes_before_ordinary_waiters():
+    lock = PriorityRLock()
+    order = []
+
+    def ordinary():
+        with lock:
+            order.append("ordinary")
+
+    def urgent():
+        with lock.priority():
+            order.append("priority")
+
+    lock.acquire()
+    priority_thread = threading.Thread(target=urgent)
+    priority_thread.start()
+    while not lock._waiting:
+        time.sleep(0.001)
+    ordinary_thread = threading.Thread(target=ordinary)
+    ordinary_thread.start()
+    time.sleep(0.05)
+    # The holder can still re-enter while the priority thread waits
+    with lock:
+        pass
+    lock.release()
+    priority_thread.join(5)
+    ordinary_thread.join(5)
+
+    assert order == ["priority", "ordinary"]
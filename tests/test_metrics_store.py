@@ -0,0 +1,49 @@
+import pytest
+
+from metrics_store import MetricsStore, parse_window
+
+
+@pytest.mark.parametrize("text, seconds", [("90", 90), ("90s", 90), ("5m", 300), ("1h", 3600), ("7d", 604800)])
+def test_parse_window(text, seconds):
+    assert parse_window(text) == seconds
+
+
+@pytest.mark.parametrize("text", ["nan", "inf", "-inf", "infm", "NaNh", "0", "-5m", "soon", ""])
+def test_parse_window_rejects_non_finite_and_empty_windows(text):
+    with pytest.raises(ValueError):
+        parse_window(text)
+
+
+@pytest.mark.parametrize("window", ["nan", "inf"])
+def test_analytics_rejects_non_finite_window(model, window):
+    response = model.app.test_client().get('/api/analytics', query_string={"window": window})
+
+    assert response.status_code == 400
+    assert "Invalid window" in response.get_json()["message"]
+
+
+def test_robot_series_are_kept_for_a_bounded_set_of_robots():
+    store = MetricsStore(robot_limit=2)
+    for robot_id in (1, 2, 3):
+        store.record_robot(robot_id, 'battery', 100.0, 50)
+
+    assert list(store.robots) == [1, 2]
+    assert store.robot_summary(2, 60, 100.0)["battery"]["summary"]["mean"] == 50
+    # Asking for robot 3 takes it on in place of robot 1, asked for least recently
+    assert store.robot_summary(3, 60, 100.0) is None
+    store.record_robot(1, 'battery', 101.0, 40)
+    store.record_robot(3, 'battery', 101.0, 70)
+    assert list(store.robots) == [2, 3]
+    assert store.tracked_robots() == [2, 3]
+    assert store.robot_summary(3, 60, 101.0)["battery"]["summary"]["mean"] == 70
+
+
+def test_robots_take_turns_being_sampled(model, monkeypatch):
+    monkeypatch.setitem(model.SIMULATION_CONFIG, "robot_sample_ticks", 2)
+    with model.state_lock:
+        first = {robot_id for robot_id, _, _ in model.sample_tick_metrics(0, 0, 0, 0)[2]}
+        second = {robot_id for robot_id, _, _ in model.sample_tick_metrics(0, 0, 0, 0)[2]}
+
+    assert first and second and not first & second
+    assert first | second == {robot.id for robot in model.fleet}
+    assert not model.sample_tick_metrics(0, 0, 0, 0, per_robot=False)[2]
@@ -0,0 +1,144 @@
+import random
+
+from path_planner import PathPlanner
+from route_coordinator import RouteCoordinator
+from warehouse_map import WarehouseMap
+
+
+def floor(rows=5, cols=20, zones=()):
+    warehouse = WarehouseMap({"rows": rows, "cols": cols, "zones": list(zones), "locations": {}})
+    return RouteCoordinator(PathPlanner(warehouse))
+
+
+def test_capped_plan_without_route_leaves_robot_as_it_was():
+    # A wall of shelves cuts the floor in two
+    coordinator = floor(zones=[{"type": "shelf", "area": [0, 10, 4, 10]}])
+    coordinator.place(1, (0, 0))
+    coordinator.plan(1, (0, 9), "1 m/s")
+    route = coordinator.summary(1)
+
+    assert coordinator.plan(1, (4, 19), "1 m/s", max_expansions=1) is None
+    assert coordinator.summary(1) == route
+
+
+def test_capped_plan_replaces_route():
+    coordinator = floor()
+    coordinator.place(1, (0, 0))
+    coordinator.plan(1, (0, 19), "1 m/s")
+
+    summary = coordinator.plan(1, (4, 0), "1 m/s", max_expansions=1000)
+
+    assert summary["to"] == [4, 0]
+    assert coordinator.summary(1)["to"] == [4, 0]
+    assert coordinator.expansions > 0
+
+
+def test_capped_plan_keeps_fallback_within_cap():
+    coordinator = floor()
+    coordinator.place(1, (0, 0))
+    coordinator.max_expansions = 1
+
+    assert coordinator.plan(1, (4, 19), "1 m/s", max_expansions=5) is None
+    assert coordinator.position(1) == (0, 0)
+    assert coordinator.expansions <= 5
+
+    summary = coordinator.plan(1, (4, 19), "1 m/s", max_expansions=1000)
+    assert summary["to"] == [4, 19]
+    assert coordinator.conflicts() is None
+
+
+def test_fallback_fails_past_parked_robot():
+    # A single corridor that robot 2 comes to park in the middle of
+    coordinator = floor(rows=1)
+    coordinator.place(1, (0, 0))
+    coordinator.place(2, (0, 19))
+    coordinator.plan(2, (0, 10), "1 m/s")
+    coordinator.max_expansions = 1
+
+    assert coordinator.plan(1, (0, 15), "1 m/s") is None
+    assert coordinator.position(1) == (0, 0)
+    assert coordinator.conflicts() is None
+
+
+def test_fallback_waits_for_crossing_robot():
+    coordinator = floor(rows=3, cols=3)
+    coordinator.place(2, (0, 1))
+    coordinator.plan(2, (2, 1), "1 m/s")
+    coordinator.place(1, (1, 0))
+    coordinator.max_expansions = 1
+
+    summary = coordinator.plan(1, (1, 2), "1 m/s")
+
+    assert summary["path"] == [[1, 0], [1, 1], [1, 2]]
+    assert summary["wait_s"] > 0
+    assert coordinator.conflicts() is None
+
+
+def test_delay_holds_robot_and_replans_robot_it_blocks():
+    coordinator = floor(rows=3)
+    coordinator.place(1, (1, 0))
+    coordinator.plan(1, (1, 19), "1 m/s")
+    coordinator.advance(2.0)
+    cell = coordinator.position(1)
+    # Robot 2 crosses the aisle just behind robot 1
+    coordinator.place(2, (0, cell[1]))
+    coordinator.plan(2, (2, cell[1]), "1 m/s")
+
+    summary = coordinator.delay(1, 20)
+
+    assert summary["wait_s"] >= 5.0
+    assert coordinator.conflicts() is None
+    coordinator.advance(4.5)
+    assert coordinator.position(1) == cell
+    assert coordinator.conflicts() is None
+
+
+def test_capped_delay_parks_robots_it_runs_out_for():
+    coordinator = floor(rows=3)
+    coordinator.place(1, (1, 0))
+    coordinator.plan(1, (1, 19), "1 m/s")
+    coordinator.advance(2.0)
+    cell = coordinator.position(1)
+    coordinator.place(2, (0, cell[1]))
+    coordinator.plan(2, (2, cell[1]), "1 m/s")
+    spent = coordinator.expansions
+
+    coordinator.delay(1, 20, max_expansions=0)
+
+    assert coordinator.expansions == spent
+    assert not coordinator.is_moving(1) and not coordinator.is_moving(2)
+    assert coordinator.conflicts() is None
+    coordinator.advance(10.0)
+    assert coordinator.position(1) == cell
+    assert coordinator.conflicts() is None
+
+
+def test_random_plans_delays_and_halts_never_collide():
+    rng = random.Random(5)
+    coordinator = floor(rows=8, cols=12, zones=[{"type": "shelf", "area": [2, col, 5, col]} for col in (3, 7)])
+    free = [(row, col) for row in range(8) for col in range(12) if coordinator.planner.is_passable((row, col))]
+    for robot_id, cell in enumerate(rng.sample(free, 25)):
+        coordinator.place(robot_id, cell)
+    for _ in range(150):
+        for robot_id in range(25):
+            if not coordinator.is_moving(robot_id) and rng.random() < 0.3:
+                coordinator.plan(robot_id, rng.choice(free), rng.choice(["0.5 m/s", "1 m/s", "2 m/s"]))
+        moving = sorted(coordinator.routes)
+        if moving and rng.random() < 0.5:
+            coordinator.delay(rng.choice(moving), rng.randint(1, 20))
+        if moving and rng.random() < 0.1:
+            coordinator.halt(rng.choice(moving))
+        assert coordinator.conflicts() is None
+        coordinator.advance(0.5)
+
+
+def test_simulation_holds_up_moving_robots(model, monkeypatch):
+    monkeypatch.setitem(model.SIMULATION_CONFIG, "route_delay_rate", 1.0)
+    with model.state_lock:
+        model.start_route(1, "Zone-B")
+        waited = model.coordinator.summary(1)["wait_s"]
+
+        model.delay_routes()
+
+        assert model.coordinator.summary(1)["wait_s"] >= waited + model.ROUTE_DELAY_S[0]
+        assert model.coordinator.conflicts() is None
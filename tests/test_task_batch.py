@@ -0,0 +1,26 @@
+import pytest
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"tasks": [["pick"]]}, "'tasks' must be a list"),
+    ({"tasks": "pick"}, "'tasks' must be a list"),
+    ({"tasks": [{"task_type": ["pick"]}]}, "task_type must be a string"),
+    ({"tasks": ["pick"], "robot_ids": [[1]]}, "'robot_ids' must be a list of integer robot ids"),
+    ({"tasks": ["pick"], "robot_ids": 1}, "'robot_ids' must be a list of integer robot ids"),
+    ({"tasks": ["fly"]}, "Unknown task types: fly"),
+    ({"tasks": []}, "No tasks given"),
+    (["pick"], "Body must be a JSON object"),
+])
+def test_malformed_batch_is_rejected(model, body, message):
+    response = model.app.test_client().post('/api/task/assign/batch', json=body)
+
+    assert response.status_code == 400
+    assert message in response.get_json()["message"]
+
+
+def test_batch_accepts_names_and_objects(model):
+    response = model.app.test_client().post('/api/task/assign/batch',
+                                            json={"tasks": ["pick", {"task_type": "move"}], "robot_ids": [1, 4]})
+
+    assert response.status_code == 200
+    assert response.get_json()["success"]
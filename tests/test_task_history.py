@@ -0,0 +1,46 @@
+from task_history import TaskHistory
+
+
+def record(history, count):
+    for i in range(count):
+        history.append({"robot_id": i % 3 + 1, "task_type": "pick" if i % 2 else "move",
+                        "task_name": "AI Pick" if i % 4 == 0 else "Move", "time": f"2026-01-01T00:00:{i:02d}"})
+
+
+def test_restore_after_wrap_around():
+    history = TaskHistory(capacity=5)
+    record(history, 16)
+
+    restored = TaskHistory.from_state(history.to_state(), capacity=5)
+
+    assert len(restored) == 5
+    assert restored.total_recorded == 16
+    assert [entry["id"] for entry in restored.recent(10)] == [16, 15, 14, 13, 12]
+    assert restored.query(robot_id=1, limit=10) == history.query(robot_id=1, limit=10)
+    assert restored.query(task_type="pick", limit=10) == history.query(task_type="pick", limit=10)
+    assert restored.ai_optimized_count == history.ai_optimized_count
+
+
+def test_restored_history_keeps_evicting():
+    history = TaskHistory(capacity=5)
+    record(history, 16)
+    restored = TaskHistory.from_state(history.to_state(), capacity=5)
+
+    record(restored, 7)
+    record(history, 7)
+
+    assert restored.total_recorded == 23
+    assert [entry["id"] for entry in restored.recent(10)] == [23, 22, 21, 20, 19]
+    for robot_id in (1, 2, 3):
+        assert restored.query(robot_id=robot_id, limit=10) == history.query(robot_id=robot_id, limit=10)
+
+
+def test_restore_into_smaller_capacity():
+    history = TaskHistory(capacity=10)
+    record(history, 8)
+
+    restored = TaskHistory.from_state(history.to_state(), capacity=4)
+
+    assert [entry["id"] for entry in restored.recent(10)] == [8, 7, 6, 5]
+    record(restored, 1)
+    assert [entry["id"] for entry in restored.recent(10)] == [9, 8, 7, 6]
@@ -0,0 +1,34 @@
+import json
+import random
+
+from warehouse_map import WarehouseMap, load_layout
+
+
+def test_cells_are_encoded_compactly():
+    warehouse = WarehouseMap(load_layout(), rng=random.Random(1))
+    document, _ = warehouse.to_json((0, 0, 1, 1))
+
+    assert ", " not in document and ": " not in document
+    assert json.loads(document)[0][0]["id"] == "A1"
+
+
+def test_restarted_map_never_serves_an_earlier_version():
+    before = WarehouseMap(load_layout(), rng=random.Random(1))
+    after = WarehouseMap(load_layout(), rng=random.Random(1))
+
+    assert before.version == after.version
+    assert before.to_json()[1] != after.to_json()[1]
+
+
+def test_stale_etag_from_earlier_map_gets_full_map(model, monkeypatch):
+    client = model.app.test_client()
+    etag = client.get('/api/warehouse/map').headers['ETag']
+    assert client.get('/api/warehouse/map', headers={'If-None-Match': etag}).status_code == 304
+
+    # The same layout and seed, as after a restart
+    monkeypatch.setattr(model, "warehouse", WarehouseMap(load_layout(model.SIMULATION_CONFIG["layout_path"]),
+                                                         rng=random.Random(1)))
+    response = client.get('/api/warehouse/map', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
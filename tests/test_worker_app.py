@@ -0,0 +1,48 @@
+import secrets
+import time
+
+import state_server
+from instrumentation import MetricsRegistry, RequestMetrics
+from state_server import StateServer
+from worker_app import create_app
+
+
+def test_drained_metrics_merge_into_another_registry():
+    worker, owner = RequestMetrics(MetricsRegistry()), RequestMetrics(MetricsRegistry())
+    worker.requests.inc("/api/robots", "GET", "200", amount=3)
+    worker.latency.observe(0.002, "/api/robots", "GET")
+    owner.latency.observe(0.2, "/api/robots", "GET")
+
+    owner.merge(worker.drain())
+
+    assert owner.requests.drain() == {("/api/robots", "GET", "200"): 3}
+    counts, total = owner.latency.drain()[("/api/robots", "GET")]
+    assert sum(counts) == 2 and total == 0.202
+    assert not any(worker.drain().values())
+
+
+def test_replica_reads_reach_owner_metrics(model, monkeypatch):
+    monkeypatch.setattr(state_server, "REPORT_EVERY_S", 0.05)
+    authkey = secrets.token_bytes(32)
+    server = StateServer(model.app, ("127.0.0.1", 0), authkey, model.state_lock, model.replica_state,
+                         merge_metrics=model.request_metrics.merge)
+    server.start()
+    try:
+        worker = create_app(server.address, authkey).test_client()
+        assert worker.get('/api/robots').status_code == 200
+        assert worker.get('/api/system/health').status_code == 200
+        assert worker.get('/metrics').status_code == 200
+
+        deadline = time.monotonic() + 5
+        while True:
+            text = model.app.test_client().get('/metrics').get_data(as_text=True)
+            if ('robofleet_http_requests_total{route="/api/system/health",method="GET",status="200"}' in text
+                    or time.monotonic() > deadline):
+                break
+            time.sleep(0.05)
+        assert 'robofleet_http_requests_total{route="/api/robots",method="GET",status="200"}' in text
+        assert 'robofleet_http_request_duration_seconds_count{route="/api/system/health",method="GET"}' in text
+        # Forwarded requests are recorded once, by the owner
+        assert 'route="/<path:path>"' not in text
+    finally:
+        server.close()
@@ -0,0 +1,173 @@
+# vector_fleet.py - Array-backed fleet advanced one vectorized tick at a time
+try:
+    import numpy as np
+except ImportError:     # optional: only this backend needs NumPy
+    np = None
+
+from fleet_store import LOW_BATTERY_THRESHOLD
+
+# Status codes, indexes into STATUSES
+STATUSES = ("idle", "working", "charging", "maintenance")
+IDLE, WORKING, CHARGING, MAINTENANCE = range(len(STATUSES))
+
+# Task kinds, indexes into TASK_KINDS (the task execution ``current_task``)
+TASK_KINDS = ("", "picking", "moving", "inspecting", "charging")
+NO_TASK, PICKING, MOVING, INSPECTING, CHARGE = range(len(TASK_KINDS))
+
+# Battery points per tick, inclusive ranges, as in simulation_tick
+DRAIN_RANGE = (1, 3)
+CHARGE_RANGE = (5, 15)
+MIN_BATTERY = 5
+FULL_BATTERY = 95
+
+# Per task kind: progress and items handled per tick once the robot has
+# arrived, as inclusive (low, high) ranges; (0, 0) for kinds without work
+PROGRESS_RANGES = ((0, 0), (1, 5), (2, 8), (2, 6), (0, 0))
+ITEM_RANGES = ((0, 0), (1, 3), (1, 2), (1, 2), (0, 0))
+
+
+class VectorFleet:
+    """The fleet's per-robot simulation state as parallel NumPy arrays.
+
+    ``step`` applies the same rules as the server's ``simulation_tick`` to
+    every robot at once: working robots drain 1-3 points and, once they
+    have arrived, make progress on their task until it completes; charging
+    robots that have arrived gain 5-15 points; robots below the low-battery
+    threshold go to maintenance, and charged robots (above 95) or recovered
+    ones go back to idle. Driving is modelled as a countdown of ticks
+    (``travel``) rather than planned routes, and there are no chargers or
+    task queues; callers assign work with ``assign``. Maintenance here
+    always means low battery.
+
+    Meant for capacity planning at fleet sizes the per-robot loop can't
+    reach; the server itself keeps using ``FleetStore``.
+    """
+
+    def __init__(self, size, battery=100, seed=None):
+        if np is None:
+            raise RuntimeError("The vectorized fleet needs NumPy (pip install numpy)")
+        self.size = size
+        self.ids = np.arange(1, size + 1, dtype=np.int64)
+        self.battery = np.full(size, battery, dtype=np.int16)
+        self.status = np.full(size, IDLE, dtype=np.int8)
+        self.task = np.full(size, NO_TASK, dtype=np.int8)
+        self.progress = np.zeros(size, dtype=np.int16)
+        self.items = np.zeros(size, dtype=np.int32)            # items handled on the current task
+        self.travel = np.zeros(size, dtype=np.int32)           # ticks of driving left
+        self.tasks_completed = np.zeros(size, dtype=np.int32)
+        self.rng = np.random.default_rng(seed)
+
+        self.ticks = 0
+        self.operations = 0                                     # working robot-ticks
+        self.items_total = {TASK_KINDS[kind]: 0 for kind in (PICKING, MOVING, INSPECTING)}
+        self.energy_used = 0
+        self.energy_charged = 0
+
+        self._progress_low = np.array([low for low, _ in PROGRESS_RANGES], dtype=np.int16)
+        self._progress_high = np.array([high for _, high in PROGRESS_RANGES], dtype=np.int16) + 1
+        self._item_low = np.array([low for low, _ in ITEM_RANGES], dtype=np.int32)
+        self._item_high = np.array([high for _, high in ITEM_RANGES], dtype=np.int32) + 1
+        self._has_work = self._progress_high > 1
+
+    @classmethod
+    def from_store(cls, fleet, seed=None):
+        """Copy the robots of a ``FleetStore``: battery, status, current
+        task and its progress. Robots still on a route count as arrived."""
+        robots = sorted(fleet, key=lambda robot: robot.id)
+        vector = cls(len(robots), seed=seed)
+        kinds = {name: kind for kind, name in enumerate(TASK_KINDS)}
+        for index, robot in enumerate(robots):
+            task_data = fleet.task_execution.get(robot.id) or {}
+            vector.ids[index] = robot.id
+            vector.battery[index] = robot.battery
+            vector.status[index] = STATUSES.index(robot.status) if robot.status in STATUSES else IDLE
+            vector.task[index] = kinds.get(task_data.get("current_task"), NO_TASK)
+            vector.progress[index] = task_data.get("progress", 0)
+        return vector
+
+    # ---------- Commands ----------
+    def assign(self, indexes, kind, travel_ticks=0, battery_cost=0):
+        """Start robots (array indexes) on a task of ``kind``, ``travel_ticks``
+        away. Charging robots track their battery as progress."""
+        self.battery[indexes] = np.clip(self.battery[indexes] - battery_cost, 0, 100)
+        self.status[indexes] = CHARGING if kind == CHARGE else WORKING
+        self.task[indexes] = kind
+        self.progress[indexes] = self.battery[indexes] if kind == CHARGE else 0
+        self.items[indexes] = 0
+        self.travel[indexes] = travel_ticks
+
+    def indexes_with_status(self, status):
+        return np.flatnonzero(self.status == status)
+
+    # ---------- Simulation ----------
+    def step(self):
+        """Advance every robot by one tick."""
+        rng = self.rng
+        size = self.size
+        status = self.status
+        battery = self.battery
+        task = self.task
+
+        # Drive first, so a robot arriving this tick also works this tick
+        np.subtract(self.travel, 1, out=self.travel, where=self.travel > 0)
+        arrived = self.travel == 0
+        active = status != IDLE
+
+        working = status == WORKING
+        drain = rng.integers(DRAIN_RANGE[0], DRAIN_RANGE[1] + 1, size, dtype=np.int16)
+        drain[~working] = 0
+        self.energy_used += int(drain.sum(dtype=np.int64))
+        np.maximum(battery - drain, MIN_BATTERY, out=battery, where=working)
+        self.operations += int(np.count_nonzero(working))
+
+        at_work = working & arrived & self._has_work[task]
+        gained = rng.integers(self._progress_low[task], self._progress_high[task], dtype=np.int16)
+        np.minimum(self.progress + gained, 100, out=self.progress, where=at_work)
+        handled = rng.integers(self._item_low[task], self._item_high[task], dtype=np.int32)
+        handled[~at_work] = 0
+        self.items += handled
+        per_kind = np.bincount(task, weights=handled, minlength=len(TASK_KINDS))
+        for kind in (PICKING, MOVING, INSPECTING):
+            self.items_total[TASK_KINDS[kind]] += int(per_kind[kind])
+        done = at_work & (self.progress >= 100)
+        status[done] = IDLE
+        self.tasks_completed[done] += 1
+
+        charging = (status == CHARGING) & arrived
+        gain = rng.integers(CHARGE_RANGE[0], CHARGE_RANGE[1] + 1, size, dtype=np.int16)
+        gain[~charging] = 0
+        charged = np.minimum(battery + gain, 100)
+        self.energy_charged += int((charged - battery).sum(dtype=np.int64))
+        battery[:] = charged
+        self.progress[charging] = battery[charging]
+
+        # Status transitions, for robots that were busy at the start of
+        # the tick
+        low = active & (battery < LOW_BATTERY_THRESHOLD) & (status != CHARGING)
+        full = active & (status == CHARGING) & (battery > FULL_BATTERY)
+        recovered = active & (status == MAINTENANCE) & (battery > LOW_BATTERY_THRESHOLD)
+        status[low] = MAINTENANCE
+        self.travel[low] = 0
+        status[full | recovered] = IDLE
+        self.ticks += 1
+
+    # ---------- Reporting ----------
+    def status_counts(self):
+        counts = np.bincount(self.status, minlength=len(STATUSES))
+        return {name: int(count) for name, count in zip(STATUSES, counts) if count}
+
+    def average_battery(self):
+        return float(self.battery.mean()) if self.size else 0.0
+
+    def robot(self, index):
+        """One robot's state as a dict, for inspection."""
+        return {
+            "id": int(self.ids[index]),
+            "status": STATUSES[self.status[index]],
+            "battery": int(self.battery[index]),
+            "current_task": TASK_KINDS[self.task[index]] or None,
+            "progress": int(self.progress[index]),
+            "items": int(self.items[index]),
+            "travel_ticks": int(self.travel[index]),
+            "tasks_completed": int(self.tasks_completed[index])
+        }
@@ -0,0 +1,216 @@
+# warehouse_map.py - Persistent warehouse grid with per-cell inventory and cached JSON
+import json
+import os
+import random
+import threading
+import time
+
+from spatial_index import SpatialIndex
+
+DEFAULT_LAYOUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "layouts", "default.json")
+
+
+def load_layout(path=None):
+    """Read a floor layout file.
+
+    ``zones`` are rectangles ``[row0, col0, row1, col1]`` (inclusive) with a
+    cell type and an optional initial stock range ``items``. An optional
+    ``repeat: [row_step, col_step, row_count, col_count]`` tiles the zone, so
+    large floors don't need one entry per shelf. ``locations`` maps the named
+    locations used by tasks to grid cells.
+    """
+    with open(path or DEFAULT_LAYOUT_PATH, encoding="utf-8") as f:
+        layout = json.load(f)
+    for key in ("rows", "cols", "zones", "locations"):
+        if key not in layout:
+            raise ValueError(f"Layout is missing '{key}'")
+    return layout
+
+
+def row_label(row):
+    # Spreadsheet-style: A..Z, AA..AZ, BA.. so labels work past 26 rows
+    label = ""
+    row += 1
+    while row:
+        row, remainder = divmod(row - 1, 26)
+        label = chr(65 + remainder) + label
+    return label
+
+
+def cell_label(row, col):
+    return f"{row_label(row)}{col + 1}"
+
+
+class WarehouseMap:
+    """Grid model of the warehouse floor.
+
+    Cell types and inventory are fixed when the map is built; robot positions
+    change only when a robot moves and are kept in a spatial index for region
+    and nearest-robot queries. Each cell's JSON is cached and only re-encoded
+    when that cell changes. Every row remembers the map version at which it
+    last changed, so a viewport's ETag only moves when a row inside it did.
+    Versions restart at 1 with every map, so they are served prefixed with
+    the map's ``epoch`` (its creation time), which no map built later
+    shares.
+    """
+
+    def __init__(self, layout=None, rng=None, bucket_size=16):
+        layout = layout or load_layout()
+        rng = rng or random.Random()
+        self.name = layout.get("name", "")
+        self.rows = layout["rows"]
+        self.cols = layout["cols"]
+        self.locations = {name: tuple(cell) for name, cell in layout["locations"].items()}
+
+        self._lock = threading.Lock()
+        self._cell_type = [["aisle"] * self.cols for _ in range(self.rows)]
+        self._items = [[0] * self.cols for _ in range(self.rows)]
+        for zone in layout["zones"]:
+            self._apply_zone(zone, rng)
+
+        self._robots_at = {}        # (row, col) -> set of robot ids
+        self.robot_index = SpatialIndex(bucket_size)
+
+        self.epoch = f"{time.time_ns():x}"
+        self.version = 1
+        self._row_version = [1] * self.rows
+        self._cell_json = [[None] * self.cols for _ in range(self.rows)]
+        self._row_json = [None] * self.rows
+        self._document = None
+
+    def _apply_zone(self, zone, rng):
+        row0, col0, row1, col1 = zone["area"]
+        row_step, col_step, row_count, col_count = zone.get("repeat", (0, 0, 1, 1))
+        low, high = zone.get("items", (0, 0))
+        for i in range(row_count):
+            for j in range(col_count):
+                offset_row, offset_col = i * row_step, j * col_step
+                for row in range(max(0, row0 + offset_row), min(self.rows, row1 + offset_row + 1)):
+                    for col in range(max(0, col0 + offset_col), min(self.cols, col1 + offset_col + 1)):
+                        self._cell_type[row][col] = zone["type"]
+                        self._items[row][col] = rng.randint(low, high) if high else 0
+
+    # ---------- Queries ----------
+    def in_bounds(self, cell):
+        return 0 <= cell[0] < self.rows and 0 <= cell[1] < self.cols
+
+    def locate(self, location):
+        """Grid cell for a named location, or None if it isn't on the map."""
+        if location in self.locations:
+            return self.locations[location]
+        for name, cell in self.locations.items():
+            if name in location:
+                return cell
+        return None
+
+    def robot_cell(self, robot_id):
+        return self.robot_index.position(robot_id)
+
+    def robots_at(self, cell):
+        return set(self._robots_at.get(cell, ()))
+
+    def robots_in_region(self, row0, col0, row1, col1):
+        return self.robot_index.query_region(row0, col0, row1, col1)
+
+    def nearest_robots(self, cell, k=1, predicate=None):
+        return self.robot_index.nearest(cell, k, predicate)
+
+    def cell_type(self, cell):
+        return self._cell_type[cell[0]][cell[1]]
+
+    def cells_of_type(self, cell_type):
+        return [(row, col) for row in range(self.rows) for col in range(self.cols)
+                if self._cell_type[row][col] == cell_type]
+
+    def item_count(self, cell):
+        return self._items[cell[0]][cell[1]]
+
+    # ---------- Mutations ----------
+    def place_robot(self, robot_id, cell):
+        """Move a robot to ``cell`` (None removes it from the map)."""
+        with self._lock:
+            old = self.robot_index.position(robot_id)
+            if old == cell:
+                return False
+            if old is not None:
+                self._robots_at[old].discard(robot_id)
+                if not self._robots_at[old]:
+                    del self._robots_at[old]
+                self.robot_index.remove(robot_id)
+                self._invalidate(old)
+            if cell is not None:
+                self._robots_at.setdefault(cell, set()).add(robot_id)
+                self.robot_index.insert(robot_id, cell)
+                self._invalidate(cell)
+            return True
+
+    def adjust_items(self, cell, delta):
+        """Add (or with a negative delta, take) items at a cell; returns the
+        number actually moved."""
+        with self._lock:
+            row, col = cell
+            current = self._items[row][col]
+            updated = max(0, current + delta)
+            if updated != current:
+                self._items[row][col] = updated
+                self._invalidate(cell)
+            return updated - current
+
+    def _invalidate(self, cell):
+        row, col = cell
+        self.version += 1
+        self._row_version[row] = self.version
+        self._cell_json[row][col] = None
+        self._row_json[row] = None
+        self._document = None
+
+    # ---------- Serialization ----------
+    def _encode_cell(self, row, col):
+        robots = self._robots_at.get((row, col))
+        label = cell_label(row, col)
+        return json.dumps({
+            "id": label,
+            "row": row,
+            "col": col,
+            "has_robot": bool(robots),
+            "robot_id": min(robots) if robots else None,
+            "robot_ids": sorted(robots) if robots else [],
+            "item_count": self._items[row][col],
+            "cell_type": "robot" if robots else self._cell_type[row][col],
+            "status": "active",
+            "label": label
+        }, separators=(",", ":"))
+
+    def _row_cells(self, row, col0, col1):
+        cells = self._cell_json[row]
+        for col in range(col0, col1 + 1):
+            if cells[col] is None:
+                cells[col] = self._encode_cell(row, col)
+        return cells[col0:col1 + 1]
+
+    def to_json(self, viewport=None):
+        """JSON array of rows for ``viewport`` (``(row0, col0, row1, col1)``,
+        inclusive; the whole floor when None) and a version string for it.
+
+        Only cells that changed since the last call are re-encoded; full rows
+        and the full document are cached as well.
+        """
+        row0, col0, row1, col1 = viewport or (0, 0, self.rows - 1, self.cols - 1)
+        full_width = col0 == 0 and col1 == self.cols - 1
+        with self._lock:
+            version = max(self._row_version[row0:row1 + 1])
+            if viewport is None and self._document is not None:
+                return self._document, f"{self.epoch}.{version}"
+
+            rows = []
+            for row in range(row0, row1 + 1):
+                if full_width:
+                    if self._row_json[row] is None:
+                        self._row_json[row] = "[" + ",".join(self._row_cells(row, 0, self.cols - 1)) + "]"
+                    rows.append(self._row_json[row])
+                else:
+                    rows.append("[" + ",".join(self._row_cells(row, col0, col1)) + "]")
+            document = "[" + ",".join(rows) + "]"
+            if viewport is None:
+                self._document = document
+            return document, f"{self.epoch}.{version}"
@@ -0,0 +1,171 @@
+# worker_app.py - HTTP worker answering fleet reads from a replica of the owner's state
+#
+# Fleet, stats and health reads and the event stream are answered here from
+# state the owner process (see state_server.py) pushes to every worker;
+# everything else is forwarded to the owner and run there. Workers hold no
+# state of their own, so any number of them can run side by side:
+#   gunicorn -w 4 -b 0.0.0.0:5000 'worker_app:create_app()'
+# with ROBOFLEET_STATE_ADDRESS and ROBOFLEET_STATE_AUTHKEY naming the
+# owner's socket and its key (hex). serve.py starts the owner and workers
+# together.
+import os
+import threading
+from datetime import datetime
+from multiprocessing import AuthenticationError
+
+from flask import Flask, Response, jsonify, request, stream_with_context
+from flask_cors import CORS
+
+from event_stream import EventBroadcaster
+from fleet_versions import FleetVersions
+from instrumentation import MetricsRegistry, RequestMetrics
+from json_fragments import FleetEncoder
+from state_server import HOP_HEADERS, StateClient, parse_address
+
+# Seconds a forwarded change may take to reach this worker's replica before
+# the response goes back without waiting for it
+FORWARD_CATCH_UP_S = 1.0
+FORWARDED_METHODS = ['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE']
+# Views answered from the replica; forwarded requests are recorded by the owner
+REPLICA_ENDPOINTS = ('get_robots', 'simulation_stats', 'system_health', 'event_stream')
+
+
+class StateReplica:
+    """The owner's published fleet state, kept current from its update
+    feed: the same snapshots, versions and deltas as the owner's own
+    handlers see, plus a broadcaster re-publishing its stream events."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.versions = FleetVersions()
+        self.encoder = FleetEncoder()
+        self.broadcaster = EventBroadcaster()
+        self.robots = {}                # robot id -> published dict, in fleet order
+        self.task_execution = {}
+        self.snapshot = (None, None)    # (snapshot, its JSON text)
+        self.stats = {}
+        self.health = {}
+        self.seed = None
+
+    def load(self, state):
+        """Start over from the owner's full state (see ``replica_state`` in
+        main.py)."""
+        with self.lock:
+            self.versions.load(*state["versions"])
+            snapshot = state["snapshot"]
+            self.robots = {robot['id']: robot for robot in snapshot["robots"]}
+            self.task_execution = dict(snapshot["task_execution"])
+            self.seed = state["seed"]
+            self._publish_fleet(snapshot)
+            self._publish_events(state["events"])
+
+    def apply(self, update):
+        kind = update[0]
+        with self.lock:
+            if kind == "publish":
+                _, changes, events = update
+                if changes is not None:
+                    self.versions.apply(changes["version"], robots=changes["robots"],
+                                        task_execution=changes["task_execution"])
+                    self.robots.update(changes["robots"])
+                    self.task_execution.update(changes["task_execution"])
+                    self._publish_fleet({
+                        "version": changes["version"],
+                        "robots": list(self.robots.values()),
+                        "task_execution": dict(self.task_execution),
+                        "timestamp": changes["timestamp"]
+                    })
+                self._publish_events(events)
+            elif kind == "event":
+                self._publish_events([update[1:]])
+
+    def _publish_fleet(self, snapshot):
+        document = self.encoder.document({"version": snapshot["version"]}, snapshot["robots"],
+                                         snapshot["task_execution"], snapshot["timestamp"])
+        self.snapshot = (snapshot, document)
+        self.broadcaster.publish("fleet", snapshot, key=snapshot["version"], payload=document)
+
+    def _publish_events(self, events):
+        for event, data, key in events:
+            if event == "stats":
+                self.stats = data
+            elif event == "health":
+                self.health = data
+            self.broadcaster.publish(event, data, key=key)
+
+
+def create_app(address=None, authkey=None):
+    """A worker app following the owner at ``address`` (default
+    ``ROBOFLEET_STATE_ADDRESS``). Returns once the replica holds the
+    owner's state."""
+    address = address or parse_address(os.environ["ROBOFLEET_STATE_ADDRESS"])
+    authkey = authkey or bytes.fromhex(os.environ["ROBOFLEET_STATE_AUTHKEY"])
+    replica = StateReplica()
+    request_metrics = RequestMetrics(MetricsRegistry())
+    state = StateClient(address, authkey, replica.load, replica.apply, metrics=request_metrics)
+    state.start()
+
+    app = Flask(__name__)
+    request_metrics.init_app(app, endpoints=REPLICA_ENDPOINTS)
+    CORS(app)
+    app.config["replica"] = replica
+    app.config["state_client"] = state
+
+    @app.route('/api/robots')
+    def get_robots():
+        state.api_calls.increment()
+
+        snapshot, document = replica.snapshot
+        since = request.args.get('since', type=int)
+        # Unknown or future versions (e.g. from before a restart) get a full copy
+        if since is None or since > snapshot['version']:
+            return app.response_class(document, mimetype='application/json')
+        if since == snapshot['version']:
+            return '', 304
+
+        version, changes = replica.versions.changes_since(since)
+        robots = changes.get('robots', {})
+        document = replica.encoder.document({"version": version, "since": since, "delta": True},
+                                            [robots[robot_id] for robot_id in sorted(robots)],
+                                            changes.get('task_execution', {}), datetime.now().isoformat())
+        return app.response_class(document, mimetype='application/json')
+
+    @app.route('/api/simulation/stats')
+    def simulation_stats():
+        state.api_calls.increment()
+        return jsonify(dict(replica.stats, seed=replica.seed))
+
+    @app.route('/api/system/health')
+    def system_health():
+        state.api_calls.increment()
+        return jsonify(replica.health)
+
+    @app.route('/api/stream')
+    def event_stream():
+        """Server-Sent Events feed of fleet, stats and health changes."""
+        state.api_calls.increment()
+
+        subscription = replica.broadcaster.subscribe()
+        return Response(
+            stream_with_context(replica.broadcaster.stream(subscription)),
+            mimetype='text/event-stream',
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    @app.route('/', defaults={'path': ''}, methods=FORWARDED_METHODS)
+    @app.route('/<path:path>', methods=FORWARDED_METHODS)
+    def forward(path):
+        """Run anything not answered from the replica in the owner."""
+        headers = [(name, value) for name, value in request.headers if name.lower() not in HOP_HEADERS]
+        try:
+            status, headers, body, sequence = state.forward(
+                request.method, request.path, request.query_string, headers, request.get_data(),
+                request.remote_addr)
+        except (OSError, EOFError, AuthenticationError):
+            return jsonify({"success": False, "message": "Fleet state server unavailable"}), 503
+        # Let whatever the request changed reach this worker's replica, so
+        # the client reads its own writes back
+        state.wait_for(sequence, FORWARD_CATCH_UP_S)
+        return Response(body, status, headers)
+
+    return app